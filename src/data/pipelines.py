@@ -1,10 +1,46 @@
-from langdetect import detect
+from langdetect import detect, DetectorFactory
+from langdetect.lang_detect_exception import LangDetectException
+import hashlib
 import re
+import sqlite3
 import time
+from functools import partial
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import pandas as pd
 from sklearn.base import TransformerMixin
 from nltk.tokenize import sent_tokenize
 
 
+def apply_parallel(func, values, n_jobs=1):
+    """
+    Apply function on chunks of values in multiple processes.
+
+    :param func: callable, function taking list of values and returning
+        list of results of the same length (has to be picklable).
+    :param values: list, values to apply function on.
+    :param n_jobs: int, number of processes (all CPUs if -1).
+    :return: list, results in the same order as values.
+    """
+    if n_jobs == -1:
+        n_jobs = cpu_count()
+
+    if n_jobs is None or n_jobs <= 1 or len(values) < 2:
+        return func(values)
+
+    # More chunks than processes to balance uneven texts lengths
+    num_chunks = min(len(values), n_jobs * 4)
+    chunk_size = -(-len(values) // num_chunks)
+    chunks = [
+        values[i:i + chunk_size] for i in range(0, len(values), chunk_size)
+    ]
+
+    with Pool(n_jobs) as pool:
+        results = pool.map(func, chunks)
+
+    return [result for chunk in results for result in chunk]
+
+
 class ColumnsFilter(TransformerMixin):
     """
     Transformer to drop columns of the dataframe.
@@ -13,6 +49,8 @@ class ColumnsFilter(TransformerMixin):
     :param all_except: list, list of columns to preserve.
     """
 
+    row_local = True
+
     def __init__(self, columns=None, all_except=None):
         self.columns = columns
         self.all_except = all_except
@@ -41,7 +79,79 @@ class ColumnsFilter(TransformerMixin):
         return df
 
 
-class EmptyValuesFilter(TransformerMixin):
+class SamplesFilter(TransformerMixin):
+    """
+    Base class of filters removing samples not satisfying a predicate.
+
+    Subclasses implement `get_mask` returning boolean mask of samples to
+    be preserved. Dataframe is neither copied nor extended with temporary
+    columns, it is only indexed by the mask once.
+    """
+
+    row_local = True
+
+    def fit(self, df, y=None, **fit_params):
+        return self
+
+    def get_mask(self, df):
+        """
+        Get mask of samples to be preserved.
+
+        :param df: pd.DataFrame, dataframe to be filtered.
+        :return: pd.Series, boolean mask aligned with dataframe.
+        """
+        raise NotImplementedError
+
+    def transform(self, df, **transform_params):
+        name = type(self).__name__
+        print(f'{name} transformation started.')
+        start_time = time.time()
+
+        df = df[self.get_mask(df)]
+
+        end_time = time.time()
+        print(f'{name} transformation ended, took '
+              f'{end_time - start_time} seconds.')
+
+        return df
+
+
+class FilterChain(SamplesFilter):
+    """
+    Chain of filters applied as one filter.
+
+    Filters are evaluated in given order (cheap ones should go first),
+    each one only on samples preserved by previous filters. Masks are
+    combined and dataframe is indexed only once at the end.
+
+    :param filters: list, list of SamplesFilter objects.
+    """
+
+    def __init__(self, filters):
+        self.filters = filters
+
+    @property
+    def row_local(self):
+        return all(f.row_local for f in self.filters)
+
+    def get_mask(self, df):
+        mask = np.ones(len(df), dtype=bool)
+
+        for samples_filter in self.filters:
+            preserved = np.flatnonzero(mask)
+            if not len(preserved):
+                break
+
+            subset = df if len(preserved) == len(df) else df.iloc[preserved]
+            mask[preserved] = np.asarray(samples_filter.get_mask(subset))
+
+            print(f'{type(samples_filter).__name__}: {mask.sum()} of '
+                  f'{len(df)} samples preserved.')
+
+        return pd.Series(mask, index=df.index)
+
+
+class EmptyValuesFilter(SamplesFilter):
     """
     Filter empty values in dataset of selected columns.
 
@@ -54,61 +164,190 @@ class EmptyValuesFilter(TransformerMixin):
     def __init__(self, columns):
         self.columns = columns
 
-    def fit(self, df, y=None, **fit_params):
-        return self
+    def get_mask(self, df):
+        mask = df[self.columns].notna().all(axis=1)
 
-    def transform(self, df, **transform_params):
-        print('EmptyValuesFilter transformation started.')
-        start_time = time.time()
+        for column in self.columns:
+            mask &= df[column] != ''
 
-        df = df.dropna(subset=self.columns)
+        return mask
 
-        for column in self.columns:
-            df = df[df[column] != '']
 
-        end_time = time.time()
-        print(f'EmptyValuesFilter transformation ended, took '
-              f'{end_time - start_time} seconds.')
+def detect_language(text, sample_size=None, seed=None):
+    """
+    Detect language of text (or of its prefix).
+
+    :param text: str, text to detect language of.
+    :param sample_size: int, number of characters from the beginning of
+        text used for detection (whole text if None).
+    :param seed: int, seed of langdetect to get deterministic results.
+    :return: str, shortcut of detected language.
+    """
+    if seed is not None:
+        DetectorFactory.seed = seed
+
+    if sample_size is None or len(text) <= sample_size:
+        return detect(text)
+
+    try:
+        return detect(text[:sample_size])
+    except LangDetectException:
+        # Prefix does not contain any language features
+        return detect(text)
+
+
+def detect_languages(texts, sample_size=None, seed=None):
+    """
+    Detect languages of list of texts.
+
+    :param texts: list, texts to detect language of.
+    :param sample_size: int, number of characters used for detection.
+    :param seed: int, seed of langdetect.
+    :return: list, shortcuts of detected languages.
+    """
+    return [detect_language(text, sample_size, seed) for text in texts]
 
-        return df
 
+class LanguageCache:
+    """
+    Persistent cache of detected languages stored in SQLite database.
+
+    :param path: str, path to SQLite database file.
+    """
 
-class ArticlesLanguageFilter(TransformerMixin):
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS languages '
+                '(key TEXT PRIMARY KEY, language TEXT)'
+            )
+
+    @staticmethod
+    def get_key(text, sample_size=None, seed=None):
+        """
+        Get cache key of text detected with given settings.
+
+        :param text: str, text to get key for.
+        :param sample_size: int, number of characters used for detection.
+        :param seed: int, seed of langdetect.
+        :return: str, cache key (hash of content and settings).
+        """
+        content = f'{sample_size}:{seed}:{text}'.encode('utf-8')
+        return hashlib.sha1(content).hexdigest()
+
+    def get_many(self, keys, batch_size=500):
+        """
+        Get cached languages.
+
+        :param keys: list, cache keys.
+        :param batch_size: int, number of keys queried at once.
+        :return: dict, dictionary of format 'key: language' (only cached
+            keys are included).
+        """
+        languages = {}
+        with sqlite3.connect(self.path) as connection:
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i + batch_size]
+                rows = connection.execute(
+                    f'SELECT key, language FROM languages WHERE key IN '
+                    f'({",".join("?" * len(batch))})',
+                    batch
+                )
+                languages.update(rows)
+
+        return languages
+
+    def set_many(self, languages):
+        """
+        Store languages in cache.
+
+        :param languages: dict, dictionary of format 'key: language'.
+        """
+        with sqlite3.connect(self.path) as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO languages (key, language) '
+                'VALUES (?, ?)',
+                languages.items()
+            )
+
+
+class ArticlesLanguageFilter(SamplesFilter):
     """
     Filter to remove articles written in different language.
 
     :param column: str, name of column to check the language in.
     :param language: str, shortcut of language (e.g. 'en').
+    :param n_jobs: int, number of processes to detect languages in (all
+        CPUs if -1).
+    :param sample_size: int, number of characters from the beginning of
+        article used for detection (whole article if None).
+    :param seed: int, seed of langdetect to get deterministic results.
+    :param cache_path: str, path to SQLite database used as persistent
+        cache of detected languages (no caching if None).
     """
 
-    def __init__(self, column, language):
+    def __init__(self, column, language, n_jobs=1, sample_size=None,
+                 seed=0, cache_path=None):
         self.column = column
         self.language = language
-
-    def fit(self, df, y=None, **fit_params):
-        return self
-
-    def transform(self, df, **transform_params):
-        print('ArticlesLanguageFilter transformation started.')
-        start_time = time.time()
-
-        df_copy = df.copy()
-
-        df_copy['lang'] = df_copy[self.column].apply(
-            lambda text: detect(text)
+        self.n_jobs = n_jobs
+        self.sample_size = sample_size
+        self.seed = seed
+        self.cache_path = cache_path
+
+    def get_languages(self, texts):
+        """
+        Get languages of texts, using cache if configured.
+
+        :param texts: list, texts to detect language of.
+        :return: list, shortcuts of detected languages.
+        """
+        detect_fn = partial(
+            detect_languages,
+            sample_size=self.sample_size,
+            seed=self.seed
         )
-        df_copy = df_copy[df_copy.lang == self.language]
 
-        df_copy.drop(['lang'], axis=1, inplace=True)
-
-        end_time = time.time()
-        print(f'ArticlesLanguageFilter transformation ended, took '
-              f'{end_time - start_time} seconds.')
-
-        return df_copy
+        if self.cache_path is None:
+            return apply_parallel(detect_fn, texts, self.n_jobs)
+
+        cache = LanguageCache(self.cache_path)
+        keys = [
+            LanguageCache.get_key(text, self.sample_size, self.seed)
+            for text in texts
+        ]
+        languages = cache.get_many(keys)
+        num_cached = sum(key in languages for key in keys)
+
+        # Detect each not cached text only once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in languages and key not in missing:
+                missing[key] = text
+
+        if len(missing):
+            detected = dict(zip(
+                missing.keys(),
+                apply_parallel(detect_fn, list(missing.values()), self.n_jobs)
+            ))
+            cache.set_many(detected)
+            languages.update(detected)
+
+        print(f'Languages of {num_cached} articles were found in cache.')
+
+        return [languages[key] for key in keys]
+
+    def get_mask(self, df):
+        languages = self.get_languages(df[self.column].tolist())
+
+        return pd.Series(
+            [language == self.language for language in languages],
+            index=df.index
+        )
 
 
-class ArticlesSizeFilter(TransformerMixin):
+class ArticlesSizeFilter(SamplesFilter):
     """
     Filter to remove all articles that are too short or too long.
 
@@ -125,33 +364,16 @@ class ArticlesSizeFilter(TransformerMixin):
         self.lower_boundary = lower_boundary
         self.upper_boundary = upper_boundary
 
-    def fit(self, df, y=None, **fit_params):
-        return self
-
-    def transform(self, df, **transform_params):
-        print('ArticlesSizeFilter transformation started.')
-        start_time = time.time()
+    def get_mask(self, df):
+        num_words = df[self.column].map(lambda text: len(text.split()))
 
-        df_copy = df.copy()
-
-        df_copy['num_words'] = df_copy[self.column].apply(
-            lambda text: len(text.split())
+        return (
+            (num_words > self.lower_boundary) &
+            (num_words < self.upper_boundary)
         )
-        df_copy = df_copy[
-            (df_copy['num_words'] > self.lower_boundary) &
-            (df_copy['num_words'] < self.upper_boundary)
-            ]
-
-        df_copy.drop(['num_words'], axis=1, inplace=True)
-
-        end_time = time.time()
-        print(f'ArticlesSizeFilter transformation ended, took '
-              f'{end_time - start_time} seconds.')
-
-        return df_copy
 
 
-class ArticlesSentenceLengthFilter(TransformerMixin):
+class ArticlesSentenceLengthFilter(SamplesFilter):
     """
     Filter all articles that have extreme values in sentences length.
 
@@ -169,9 +391,6 @@ class ArticlesSentenceLengthFilter(TransformerMixin):
         self.lower_boundary = lower_boundary
         self.upper_boundary = upper_boundary
 
-    def fit(self, df, y=None, **fit_params):
-        return self
-
     def get_avg_sentence_length(self, text, num_words):
         result = re.sub(r'\w\n', '. ', text)
         result = re.sub(r'\.{2,}', '. ', result)
@@ -179,34 +398,64 @@ class ArticlesSentenceLengthFilter(TransformerMixin):
 
         return num_words / len(sent_tokenize(result))
 
-    def transform(self, df, **transform_params):
-        print('ArticlesSentenceLengthFilter transformation started.')
-        start_time = time.time()
-
-        df_copy = df.copy()
-
-        df_copy['num_words'] = df_copy[self.column].apply(
-            lambda text: len(text.split())
+    def get_mask(self, df):
+        avg_sent_length = df[self.column].map(
+            lambda text: self.get_avg_sentence_length(
+                text,
+                len(text.split())
+            )
         )
-        df_copy['avg_sent_length'] = df_copy.apply(
-            lambda sample: self.get_avg_sentence_length(
-                sample[self.column],
-                sample['num_words']
-            ),
-            axis=1
+
+        return (
+            (avg_sent_length > self.lower_boundary) &
+            (avg_sent_length < self.upper_boundary)
         )
-        df_copy = df_copy[
-            (df_copy['avg_sent_length'] > self.lower_boundary) &
-            (df_copy['avg_sent_length'] < self.upper_boundary)
-            ]
 
-        df_copy.drop(['avg_sent_length', 'num_words'], axis=1, inplace=True)
 
-        end_time = time.time()
-        print(f'ArticlesSentenceLengthFilter transformation ended, took '
-              f'{end_time - start_time} seconds.')
+# Rules applied (in this order) to lowercase text by TextPreprocessor.
+TEXT_CLEANING_RULES = [
+    # Remove html characters.
+    (re.compile(r'<.*?>'), ''),
+    # Remove other special characters.
+    (re.compile(r'[^a-zA-Z0-9\.,?!]+'), ' '),
+    # Remove urls
+    (re.compile(r'(www|http:|https:)+[^\s]+[\w]'), ''),
+    # Remove xml specific strings
+    (re.compile(r'<!--//<!\[CDATA\[[^\]]*\]\]>-->'), ''),
+    # Remove specific sentences repeating in many articles
+    (re.compile(r'feel free to share this neuroscience news.'), ''),
+    (re.compile(r'(sources for this article include:([^\s]+[\w]*)*)'), ''),
+    (re.compile(r'(naturalnews)'), ''),
+    (re.compile(r"Please enter a valid email address. Privacy Policy Leave "
+                r"this field empty if you're human"), ''),
+    # Remove keywords specific for newsletters
+    (re.compile(r'sign up'), ''),
+    (re.compile(r'newsletters|newsletter'), ''),
+]
+
+
+def clean_text(text):
+    """
+    Clean text with all text cleaning rules in one pass.
+
+    :param text: str, text to be cleaned.
+    :return: str, cleaned text.
+    """
+    text = text.lower()
+    for pattern, replacement in TEXT_CLEANING_RULES:
+        text = pattern.sub(replacement, text)
+
+    return text
 
-        return df_copy
+
+def clean_texts(texts):
+    """
+    Clean list of texts.
+
+    :param texts: list, texts to be cleaned.
+    :return: list, cleaned texts.
+    """
+    return [clean_text(text) for text in texts]
 
 
 class TextPreprocessor(TransformerMixin):
@@ -218,11 +467,19 @@ class TextPreprocessor(TransformerMixin):
     2. Removing html tags.
     3. Remove special characters.
 
+    All rules (see TEXT_CLEANING_RULES) are precompiled and applied
+    on each text in one pass.
+
     :param column: str, name of column to clean text in.
+    :param n_jobs: int, number of processes to clean texts in (all CPUs
+        if -1).
     """
 
-    def __init__(self, column):
+    row_local = True
+
+    def __init__(self, column, n_jobs=1):
         self.column = column
+        self.n_jobs = n_jobs
 
     def fit(self, df, y=None, **fit_params):
         return self
@@ -231,81 +488,65 @@ class TextPreprocessor(TransformerMixin):
         print('TextPreprocessor transformation started.')
         start_time = time.time()
 
-        df_copy = df.copy()
-
-        # Lowercase text.
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: text.lower()
-        )
-
-        # Remove html characters.
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'<.*?>', '', text)
-        )
-        # Remove other special characters.
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'[^a-zA-Z0-9\.,?!]+', ' ', text)
-        )
-        # Remove urls
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'(www|http:|https:)+[^\s]+[\w]', '', text)
+        texts = apply_parallel(
+            clean_texts,
+            df[self.column].tolist(),
+            self.n_jobs
         )
-        # Remove xml specific strings
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'<!--//<!\[CDATA\[[^\]]*\]\]>-->', '', text)
-        )
-        # Remove specific sentences repeating in many articles
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'feel free to share this neuroscience news.', '', text)
-        )
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'(sources for this article include:([^\s]+[\w]*)*)', '', text)
-        )
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'(naturalnews)', '', text)
-        )
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r"Please enter a valid email address. Privacy Policy Leave this field empty if you're human", '', text)
-        )
-        # Remove keywords specific for newsletters 
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'sign up', '', text)
-        )
-        df_copy[self.column] = df_copy[self.column].apply(
-            lambda text: re.sub(r'newsletters|newsletter', '', text)
-        )
-         
+        # Input dataframe is left untouched, `assign` returns its copy
+        # with cleaned column (in-place assignment could write into
+        # frames sharing data with input, e.g. chunks of parallel run)
+        df = df.assign(**{self.column: texts})
 
         end_time = time.time()
         print(f'TextPreprocessor transformation ended, took '
               f'{end_time - start_time} seconds.')
 
-        return df_copy
+        return df
 
 
-class DuplicatesFilter(TransformerMixin):
+class DuplicatesFilter(SamplesFilter):
     """
     Filter to remove duplicate articles.
 
     :param column: str, name of column to check duplicates in.
     """
 
+    # Whether sample is kept depends also on other samples, so the filter
+    # cannot be applied on chunks of data independently
+    row_local = False
+
     def __init__(self, column):
         self.column = column
 
-    def fit(self, df, y=None, **fit_params):
-        return self
+    def get_mask(self, df):
+        return ~df.duplicated(subset=[self.column])
 
-    def transform(self, df, **transform_params):
-        print('DuplicatesFilter transformation started.')
-        start_time = time.time()
+    def transform_incremental(self, df, seen):
+        """
+        Remove duplicates within chunk of data and also samples already
+        seen in previous chunks.
+
+        Samples are compared by 64-bit hashes of column values, which are
+        stored in `seen` set, so memory usage is bounded by number of
+        unique samples, not by their size.
 
-        df_copy = df.copy()
+        :param df: pd.DataFrame, chunk of data.
+        :param seen: set, hashes of samples from previous chunks (updated
+            in place).
+        :return: pd.DataFrame, chunk without duplicates.
+        """
+        print('DuplicatesFilter incremental transformation started.')
+        start_time = time.time()
 
-        df_copy.drop_duplicates(subset=[self.column], inplace=True)
+        hashes = pd.util.hash_pandas_object(df[self.column], index=False)
+        is_new = np.array([h not in seen for h in hashes.tolist()], dtype=bool)
+        mask = ~hashes.duplicated() & is_new
+        seen.update(hashes[mask].tolist())
+        df = df[mask]
 
         end_time = time.time()
-        print(f'DuplicatesFilter transformation ended, took '
+        print(f'DuplicatesFilter incremental transformation ended, took '
               f'{end_time - start_time} seconds.')
 
-        return df_copy
+        return df
@@ -1,36 +1,575 @@
+import hashlib
+import sys
+from argparse import ArgumentParser
+from functools import partial
+from multiprocessing import Pool, cpu_count
+from os import listdir, makedirs, remove, utime
+from os.path import dirname, join, abspath, isfile, getmtime, getsize
+import pandas as pd
 from sklearn.pipeline import Pipeline
+
+sys.path.append(abspath(join(dirname(__file__), '../../')))
 import src.data.pipelines as ppl
 
 
-preprocessing_pipeline = Pipeline(
-    [
+def get_pipeline(drop_duplicates=True, language_sample_size=None,
+                 language_cache=None):
+    """
+    Get preprocessing pipeline.
+
+    :param drop_duplicates: bool, whether to remove duplicate articles
+        (False for prediction, where each text is preprocessed on its
+        own, so identical texts are all kept).
+    :param language_sample_size: int, number of characters from the
+        beginning of article used for language detection (whole article
+        if None).
+    :param language_cache: str, path to SQLite database used as cache of
+        detected languages (no caching if None).
+    :return: sklearn.pipeline.Pipeline, preprocessing pipeline.
+    """
+    steps = [
         ('cols_filter', ppl.ColumnsFilter(all_except=['body', 'label'])),
         ('nan_filter', ppl.EmptyValuesFilter(['body'])),
         ('dup_filter', ppl.DuplicatesFilter('body')),
         ('text_preprocess', ppl.TextPreprocessor('body')),
-        ('size_filter', ppl.ArticlesSizeFilter('body', 100, 6000)),
-        ('sent_len_filter', ppl.ArticlesSentenceLengthFilter('body', 8, 50)),
-        ('lang_filter', ppl.ArticlesLanguageFilter('body', 'en')),
+        ('articles_filter', ppl.FilterChain([
+            ppl.ArticlesSizeFilter('body', 100, 6000),
+            ppl.ArticlesSentenceLengthFilter('body', 8, 50),
+            ppl.ArticlesLanguageFilter(
+                'body', 'en',
+                sample_size=language_sample_size,
+                cache_path=language_cache
+            ),
+        ])),
     ]
-)
 
+    return Pipeline(
+        [(name, step) for name, step in steps
+         if drop_duplicates or name != 'dup_filter']
+    )
+
+
+preprocessing_pipeline = get_pipeline()
+
+
+def transform_steps(steps, df):
+    """
+    Apply transformers on dataframe one after another.
+
+    :param steps: list, list of transformers.
+    :param df: pd.DataFrame, dataframe to be transformed.
+    :return: pd.DataFrame, transformed dataframe.
+    """
+    for step in steps:
+        df = step.transform(df)
+
+    return df
+
+
+def get_segments(pipeline):
+    """
+    Split pipeline steps into segments of row-local and global steps.
+
+    Row-local steps (transformers with `row_local` attribute set to
+    True) transform each sample independently of others, so they can be
+    applied on chunks of data in parallel.
+
+    :param pipeline: sklearn.pipeline.Pipeline, pipeline to be split.
+    :return: list, list of tuples (is_row_local, transformers).
+    """
+    segments = []
+    for _, step in pipeline.steps:
+        row_local = getattr(step, 'row_local', False)
+        if len(segments) and segments[-1][0] == row_local:
+            segments[-1][1].append(step)
+        else:
+            segments.append((row_local, [step]))
+
+    return segments
+
+
+def transform_chunks(steps, df, pool, n_jobs, chunk_size=None):
+    """
+    Apply row-local transformers on chunks of dataframe in process pool.
+
+    :param steps: list, list of row-local transformers.
+    :param df: pd.DataFrame, dataframe to be transformed.
+    :param pool: multiprocessing.Pool, pool of processes (None to
+        transform dataframe in current process).
+    :param n_jobs: int, number of processes in pool.
+    :param chunk_size: int, number of samples in one chunk (by default,
+        data are split to 4 chunks per process).
+    :return: pd.DataFrame, transformed dataframe.
+    """
+    if pool is None or len(df) < 2:
+        return transform_steps(steps, df)
+
+    size = chunk_size or -(-len(df) // (n_jobs * 4))
+    chunks = [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+    return pd.concat(pool.map(partial(transform_steps, steps), chunks))
+
+
+def transform_parallel(pipeline, df, pool, n_jobs, chunk_size=None):
+    """
+    Transform dataframe with pipeline, row-local steps are performed on
+    chunks of data in process pool.
+
+    Global steps (e.g. duplicates filter) are performed on all data
+    in main process, so the result is the same as in serial run.
+
+    :param pipeline: sklearn.pipeline.Pipeline, pipeline to be used.
+    :param df: pd.DataFrame, dataframe to be transformed.
+    :param pool: multiprocessing.Pool, pool of processes.
+    :param n_jobs: int, number of processes in pool.
+    :param chunk_size: int, number of samples in one chunk (by default,
+        data are split to 4 chunks per process).
+    :return: pd.DataFrame, transformed dataframe.
+    """
+    for row_local, steps in get_segments(pipeline):
+        if row_local:
+            df = transform_chunks(steps, df, pool, n_jobs, chunk_size)
+        else:
+            df = transform_steps(steps, df)
+
+    return df
+
+
+# Parameters of transformers which do not affect result of transformation
+NON_RESULT_PARAMS = {'n_jobs', 'cache_path'}
+
+# Version of preprocessing code, has to be increased whenever behaviour
+# of transformers changes (cached results of steps are not used then)
+PREPROCESSING_VERSION = 1
+
+
+def get_preprocessing_version():
+    """
+    Get version of preprocessing, which changes with preprocessing code
+    version and with module-level rules used by transformers.
+
+    :return: str, hash of preprocessing version and text cleaning rules.
+    """
+    rules = repr([
+        (pattern.pattern, pattern.flags, replacement)
+        for pattern, replacement in ppl.TEXT_CLEANING_RULES
+    ])
+    content = f'{PREPROCESSING_VERSION}:{rules}'.encode('utf-8')
+
+    return hashlib.sha1(content).hexdigest()
+
+
+def get_params_repr(value):
+    """
+    Get deterministic representation of transformer parameters.
+
+    :param value: object, transformer or its parameter value.
+    :return: str, representation of value.
+    """
+    if isinstance(value, (list, tuple)):
+        return f'[{", ".join(get_params_repr(item) for item in value)}]'
+
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        params = ', '.join(
+            f'{name}={get_params_repr(param)}'
+            for name, param in sorted(vars(value).items())
+            if name not in NON_RESULT_PARAMS
+        )
+        return f'{type(value).__name__}({params})'
+
+    return repr(value)
+
+
+def get_dataframe_fingerprint(df):
+    """
+    Get fingerprint of dataframe content.
+
+    :param df: pd.DataFrame, dataframe to get fingerprint of.
+    :return: str, hash of dataframe values, index and columns.
+    """
+    fingerprint = hashlib.sha1()
+    columns = repr(list(zip(df.columns, df.dtypes)))
+    fingerprint.update(columns.encode('utf-8'))
+    fingerprint.update(
+        pd.util.hash_pandas_object(df, index=True).values.tobytes()
+    )
+
+    return fingerprint.hexdigest()
+
+
+def get_step_key(previous_key, step):
+    """
+    Get cache key of step result.
+
+    :param previous_key: str, key of step input (fingerprint of data or
+        key of previous step).
+    :param step: object, transformer.
+    :return: str, cache key.
+    """
+    content = f'{previous_key}:{get_preprocessing_version()}:' \
+              f'{get_params_repr(step)}'.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+class StepsCache:
+    """
+    On-disk cache of results of pipeline steps.
+
+    Results are stored as pickled dataframes. When size of cache
+    exceeds maximum size, least recently used results are removed.
+
+    :param cache_dir: str, directory where results are stored.
+    :param max_size: int, maximum size of cache in bytes.
+    """
+
+    def __init__(self, cache_dir, max_size=10 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        makedirs(cache_dir, exist_ok=True)
+
+    def get_path(self, key):
+        return join(self.cache_dir, f'{key}.pkl')
+
+    def __contains__(self, key):
+        return isfile(self.get_path(key))
+
+    def get(self, key):
+        """
+        Get cached result.
+
+        :param key: str, cache key.
+        :return: pd.DataFrame, cached dataframe (None if not cached).
+        """
+        if key not in self:
+            return None
+
+        # Mark result as recently used
+        utime(self.get_path(key))
+        return pd.read_pickle(self.get_path(key))
+
+    def set(self, key, df):
+        """
+        Store result in cache and evict old results if needed.
+
+        :param key: str, cache key.
+        :param df: pd.DataFrame, dataframe to be stored.
+        """
+        df.to_pickle(self.get_path(key))
+        self.evict(keep=key)
 
-def preprocess_data(dataframes):
+    def evict(self, keep=None):
+        """
+        Remove least recently used results until cache fits max size.
+
+        :param keep: str, key of result which should not be removed.
+        """
+        files = [
+            join(self.cache_dir, name)
+            for name in listdir(self.cache_dir) if name.endswith('.pkl')
+        ]
+        files.sort(key=getmtime)
+        size = sum(getsize(path) for path in files)
+
+        for path in files:
+            if size <= self.max_size:
+                break
+            if keep is not None and path == self.get_path(keep):
+                continue
+            size -= getsize(path)
+            remove(path)
+
+
+def transform_cached(pipeline, df, cache, pool=None, n_jobs=1,
+                     chunk_size=None):
+    """
+    Transform dataframe with pipeline, using cached results of steps.
+
+    Key of each step result is combined from fingerprint of input data,
+    version of preprocessing (see `get_preprocessing_version`) and
+    classes and parameters of all steps up to this one. Result of
+    the longest already cached prefix of pipeline is loaded and only
+    the remaining steps are performed (and cached).
+
+    :param pipeline: sklearn.pipeline.Pipeline, pipeline to be used.
+    :param df: pd.DataFrame, dataframe to be transformed.
+    :param cache: StepsCache, cache of steps results.
+    :param pool: multiprocessing.Pool, pool of processes used for
+        row-local steps (None to transform in current process).
+    :param n_jobs: int, number of processes in pool.
+    :param chunk_size: int, number of samples in one chunk.
+    :return: pd.DataFrame, transformed dataframe.
+    """
+    steps = [step for _, step in pipeline.steps]
+
+    keys = []
+    key = get_dataframe_fingerprint(df)
+    for step in steps:
+        key = get_step_key(key, step)
+        keys.append(key)
+
+    start = next(
+        (i + 1 for i in reversed(range(len(keys))) if keys[i] in cache),
+        0
+    )
+    if start > 0:
+        print(f'Loading cached result of first {start} steps.')
+        df = cache.get(keys[start - 1])
+
+    for step, key in zip(steps[start:], keys[start:]):
+        if getattr(step, 'row_local', False):
+            df = transform_chunks([step], df, pool, n_jobs, chunk_size)
+        else:
+            df = step.transform(df)
+        cache.set(key, df)
+
+    return df
+
+
+def preprocess_data(dataframes, n_jobs=1, chunk_size=None, cache_dir=None,
+                    cache_size=10 * 1024 ** 3, drop_duplicates=True,
+                    language_sample_size=None, language_cache=None):
     """
     Function to preprocess the data using Pipelines.
 
     Following transformations are performed:
-    1. Filter columns that are not needed.
-    2. Filtering samples by size of articles (lower and upper boundary).
-    3. Filtering samples by language of articles - only english will
-        be used.
-    4. Text preprocessing (e.g. removing special characters, tags, etc),
+    1. Filter columns that are not needed and samples with empty text.
+    2. Filtering duplicate articles (unless `drop_duplicates` is False).
+    3. Text preprocessing (e.g. removing special characters, tags, etc),
         making text lowercase, etc.
+    4. Filtering samples by size of articles, average length of their
+        sentences and language - only english will be used.
+
+    Row-local transformations (including language detection) can be
+    performed on chunks of data in multiple processes (transformers
+    should not use multiple processes themselves in that case). Results of all steps can be
+    cached on disk, so re-running pipeline with unchanged first steps
+    loads their result instead of recomputing it.
 
     :param dataframes: list, dataframes to be preprocessed.
+    :param n_jobs: int, number of processes (all CPUs if -1).
+    :param chunk_size: int, number of samples in one chunk processed
+        by one process.
+    :param cache_dir: str, directory of steps results cache (no caching
+        if None).
+    :param cache_size: int, maximum size of cache in bytes.
+    :param drop_duplicates: bool, whether to remove duplicate articles
+        (False for prediction, where every text has to be preserved).
+    :param language_sample_size: int, number of characters of article
+        used for language detection (whole article if None).
+    :param language_cache: str, path to SQLite database used as cache of
+        detected languages (no caching if None).
     :return: list, preprocessed dataframes.
     """
-    return [
-        preprocessing_pipeline.transform(dataframe)
-        for dataframe in dataframes
-    ]
+    pipeline = get_pipeline(
+        drop_duplicates, language_sample_size, language_cache
+    )
+
+    if n_jobs == -1:
+        n_jobs = cpu_count()
+
+    parallel = n_jobs is not None and n_jobs > 1
+
+    if cache_dir is not None:
+        cache = StepsCache(cache_dir, cache_size)
+        pool = Pool(n_jobs) if parallel else None
+        try:
+            return [
+                transform_cached(
+                    pipeline, dataframe, cache, pool, n_jobs, chunk_size
+                )
+                for dataframe in dataframes
+            ]
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    if not parallel:
+        steps = [step for _, step in pipeline.steps]
+        return [transform_steps(steps, dataframe) for dataframe in dataframes]
+
+    with Pool(n_jobs) as pool:
+        return [
+            transform_parallel(pipeline, dataframe, pool, n_jobs, chunk_size)
+            for dataframe in dataframes
+        ]
+
+
+def read_chunks(path, chunk_size=10000, index_column='id'):
+    """
+    Read raw dataset from csv or JSON lines file in chunks.
+
+    :param path: str, path to csv or JSON lines (.jsonl) file.
+    :param chunk_size: int, number of samples in one chunk.
+    :param index_column: str, column used as index (if present).
+    :return: generator, generator of dataframes.
+    """
+    if path.endswith('.jsonl'):
+        reader = pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        reader = pd.read_csv(path, chunksize=chunk_size)
+
+    for chunk in reader:
+        if index_column in chunk.columns:
+            chunk = chunk.set_index(index_column)
+        yield chunk
+
+
+class ChunksWriter:
+    """
+    Writer appending dataframes to csv or Parquet file.
+
+    Parquet output requires pyarrow to be installed.
+
+    :param path: str, path to output file (.csv or .parquet).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet_writer = None
+        self.num_written = 0
+
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError('Package pyarrow is required to write '
+                                  'Parquet files.')
+            self.pyarrow = pyarrow
+
+    def write(self, df):
+        """
+        Append dataframe to output file.
+
+        :param df: pd.DataFrame, dataframe to be written.
+        """
+        if not len(df):
+            return
+
+        if self.path.endswith('.parquet'):
+            if self.parquet_writer is None:
+                table = self.pyarrow.Table.from_pandas(df)
+                self.parquet_writer = self.pyarrow.parquet.ParquetWriter(
+                    self.path, table.schema
+                )
+            else:
+                table = self.pyarrow.Table.from_pandas(
+                    df, schema=self.parquet_writer.schema
+                )
+            self.parquet_writer.write_table(table)
+        else:
+            df.to_csv(
+                self.path,
+                mode='w' if self.num_written == 0 else 'a',
+                header=self.num_written == 0
+            )
+
+        self.num_written += len(df)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+
+def preprocess_file(
+        input_path,
+        output_path,
+        chunk_size=10000,
+        n_jobs=1,
+        pipeline=preprocessing_pipeline
+):
+    """
+    Preprocess raw dataset out of core.
+
+    Raw dataset is read in chunks, each chunk is pushed through the
+    pipeline and preserved samples are appended to output file. Global
+    steps are performed incrementally (e.g. duplicates are detected
+    across chunks using set of hashes), so whole dataset never has to
+    fit in memory.
+
+    :param input_path: str, path to raw dataset (csv or .jsonl file).
+    :param output_path: str, path to output file (.csv or .parquet).
+    :param chunk_size: int, number of samples read at once.
+    :param n_jobs: int, number of processes used for row-local steps
+        (all CPUs if -1).
+    :param pipeline: sklearn.pipeline.Pipeline, pipeline to be used.
+    :return: int, number of preprocessed samples written to output.
+    """
+    if n_jobs == -1:
+        n_jobs = cpu_count()
+
+    segments = get_segments(pipeline)
+    for row_local, steps in segments:
+        for step in steps:
+            if not row_local and not hasattr(step, 'transform_incremental'):
+                raise ValueError(f'{type(step).__name__} cannot be used '
+                                 f'in chunked preprocessing.')
+
+    # State of global steps shared across chunks
+    states = {
+        id(step): set()
+        for row_local, steps in segments if not row_local
+        for step in steps
+    }
+
+    pool = Pool(n_jobs) if n_jobs is not None and n_jobs > 1 else None
+    writer = ChunksWriter(output_path)
+    num_read = 0
+
+    try:
+        for chunk in read_chunks(input_path, chunk_size):
+            num_read += len(chunk)
+
+            for row_local, steps in segments:
+                if row_local:
+                    chunk = transform_chunks(steps, chunk, pool, n_jobs)
+                    continue
+                for step in steps:
+                    state = states[id(step)]
+                    chunk = step.transform_incremental(chunk, state)
+
+            writer.write(chunk)
+            print(f'Preprocessed {num_read} samples, '
+                  f'{writer.num_written} written.')
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return writer.num_written
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-i", "--input", dest="input", required=True,
+                        help="Raw dataset (csv or .jsonl file).")
+    parser.add_argument("-o", "--output", dest="output", required=True,
+                        help="Output file (.csv or .parquet).")
+    parser.add_argument("-cs", "--chunk-size", dest="chunk_size",
+                        default=10000, type=int,
+                        help="Number of samples read at once.")
+    parser.add_argument("-j", "--jobs", dest="n_jobs", default=1, type=int,
+                        help="Number of processes (-1 for all CPUs).")
+    parser.add_argument("-ls", "--language-sample-size",
+                        dest="language_sample_size", default=None, type=int,
+                        help="Number of characters of article used for "
+                             "language detection (whole article if not "
+                             "set).")
+    parser.add_argument("-lc", "--language-cache", dest="language_cache",
+                        default=None,
+                        help="SQLite database with cached detected "
+                             "languages shared between runs.")
+    args = parser.parse_args()
+
+    preprocess_file(
+        input_path=args.input,
+        output_path=args.output,
+        chunk_size=args.chunk_size,
+        n_jobs=args.n_jobs,
+        pipeline=get_pipeline(
+            language_sample_size=args.language_sample_size,
+            language_cache=args.language_cache
+        )
+    )
@@ -0,0 +1,411 @@
+import gzip
+import hashlib
+import json
+import sqlite3
+import zlib
+from os import listdir, makedirs
+from os.path import exists, getsize, join
+
+
+class JsonFilesStorage:
+    """
+    Storage of records, each one stored in its own JSON file.
+
+    :param folder: str, folder where records are stored.
+    :param key: str, attribute of record used as its id.
+    """
+
+    def __init__(self, folder, key='id'):
+        self.folder = folder
+        self.key = key
+        makedirs(folder, exist_ok=True)
+
+    def get_path(self, record_id):
+        return join(self.folder, f'{record_id}.json')
+
+    def save(self, records):
+        """
+        Save (insert or replace) records.
+
+        :param records: list, list of records (dictionaries).
+        """
+        for record in records:
+            with open(self.get_path(record[self.key]), 'w') as f:
+                json.dump(record, f)
+
+    def get(self, record_id):
+        """
+        Get record by id.
+
+        :param record_id: object, id of record.
+        :return: dict, record (None if not stored).
+        """
+        if record_id not in self:
+            return None
+
+        with open(self.get_path(record_id), 'r') as f:
+            return json.load(f)
+
+    def get_partitions(self, num_partitions):
+        """
+        Split stored records into partitions, which can be read
+        independently (e.g. in different processes).
+
+        :param num_partitions: int, maximum number of partitions.
+        :return: list, list of partitions descriptions.
+        """
+        names = sorted(
+            name for name in listdir(self.folder) if name.endswith('.json')
+        )
+        size = max(1, -(-len(names) // num_partitions))
+        return [names[i:i + size] for i in range(0, len(names), size)]
+
+    def iter_partition(self, partition):
+        """
+        Iterate over records of partition.
+
+        :param partition: object, partition description.
+        :return: generator, generator of records.
+        """
+        for name in partition:
+            with open(join(self.folder, name), 'r') as f:
+                yield json.load(f)
+
+    def close(self):
+        pass
+
+    def __contains__(self, record_id):
+        return exists(self.get_path(record_id))
+
+    def __iter__(self):
+        for partition in self.get_partitions(1):
+            yield from self.iter_partition(partition)
+
+    def __len__(self):
+        return sum(
+            1 for name in listdir(self.folder) if name.endswith('.json')
+        )
+
+
+class JsonlShardsStorage:
+    """
+    Storage of records appended to size-capped JSON lines shards.
+
+    Shards can be compressed with gzip. Index file maps id of each
+    record to shard and line of its latest version and hash of its
+    content, so unchanged records are not written again and changed
+    records are appended as new versions (older versions are skipped
+    when reading). Partial last line of active shard (left by
+    interrupted write) is removed when storage is opened, so line
+    numbers in index stay valid.
+
+    :param folder: str, folder where shards are stored.
+    :param key: str, attribute of record used as its id.
+    :param max_shard_size: int, maximum size of one shard in bytes.
+    :param compress: bool, whether to compress shards with gzip.
+    """
+
+    def __init__(self, folder, key='id', max_shard_size=64 * 2 ** 20,
+                 compress=False):
+        self.folder = folder
+        self.key = key
+        self.max_shard_size = max_shard_size
+        self.compress = compress
+        makedirs(folder, exist_ok=True)
+
+        self.index = {}
+        self.shard = 0
+        self.load_index()
+        self.shard_lines = self.repair_shard(self.shard)
+
+    def get_shard_path(self, shard):
+        extension = 'jsonl.gz' if self.compress else 'jsonl'
+        return join(self.folder, f'shard-{shard:05d}.{extension}')
+
+    def get_index_path(self):
+        return join(self.folder, 'index.tsv')
+
+    def open_shard(self, shard, mode):
+        if self.compress:
+            return gzip.open(self.get_shard_path(shard), f'{mode}t')
+        return open(self.get_shard_path(shard), mode)
+
+    def load_index(self):
+        if not exists(self.get_index_path()):
+            return
+
+        with open(self.get_index_path(), 'r') as f:
+            for line in f:
+                record_id, shard, line_number, content_hash = \
+                    line.rstrip('\n').split('\t')
+                self.index[record_id] = (
+                    int(shard), int(line_number), content_hash
+                )
+                self.shard = max(self.shard, int(shard))
+
+    def read_shard_bytes(self, shard):
+        with open(self.get_shard_path(shard), 'rb') as f:
+            data = f.read()
+
+        if not self.compress:
+            return data, True
+
+        # Shard is sequence of gzip members (one per append), the last
+        # one can be truncated
+        content = []
+        while data:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                content.append(decompressor.decompress(data))
+            except zlib.error:
+                return b''.join(content), False
+            if not decompressor.eof:
+                return b''.join(content), False
+            data = decompressor.unused_data
+
+        return b''.join(content), True
+
+    def repair_shard(self, shard):
+        """
+        Remove partial last line of shard and count its lines.
+
+        :param shard: int, number of shard.
+        :return: int, number of complete lines in shard.
+        """
+        if not exists(self.get_shard_path(shard)):
+            return 0
+
+        content, complete = self.read_shard_bytes(shard)
+        end = content.rfind(b'\n') + 1
+
+        if end < len(content) or not complete:
+            print(f'Removing partial line from shard {shard}.')
+            if self.compress:
+                with gzip.open(self.get_shard_path(shard), 'wb') as f:
+                    f.write(content[:end])
+            else:
+                with open(self.get_shard_path(shard), 'r+b') as f:
+                    f.truncate(end)
+
+        return content.count(b'\n', 0, end)
+
+    def save(self, records):
+        """
+        Save (insert or replace) records, unchanged records are skipped.
+
+        :param records: list, list of records (dictionaries).
+        """
+        path = self.get_shard_path(self.shard)
+        if exists(path) and getsize(path) >= self.max_shard_size:
+            self.shard += 1
+            self.shard_lines = 0
+
+        index_lines = []
+        with self.open_shard(self.shard, 'a') as f:
+            for record in records:
+                line = json.dumps(record)
+                content_hash = hashlib.sha1(line.encode('utf-8')).hexdigest()
+                record_id = str(record[self.key])
+
+                stored = self.index.get(record_id)
+                if stored is not None and stored[2] == content_hash:
+                    continue
+
+                f.write(f'{line}\n')
+                self.index[record_id] = (
+                    self.shard, self.shard_lines, content_hash
+                )
+                index_lines.append(
+                    f'{record_id}\t{self.shard}\t{self.shard_lines}\t'
+                    f'{content_hash}\n'
+                )
+                self.shard_lines += 1
+
+        # Index is written after records, so crash never leaves index
+        # pointing to missing record
+        with open(self.get_index_path(), 'a') as f:
+            f.writelines(index_lines)
+
+    def get(self, record_id):
+        """
+        Get record by id.
+
+        :param record_id: object, id of record.
+        :return: dict, record (None if not stored).
+        """
+        stored = self.index.get(str(record_id))
+        if stored is None:
+            return None
+
+        shard, line_number, _ = stored
+        with self.open_shard(shard, 'r') as f:
+            for i, line in enumerate(f):
+                if i == line_number:
+                    return json.loads(line)
+
+    def get_partitions(self, num_partitions):
+        """
+        Split stored records into partitions (groups of shards), which
+        can be read independently (e.g. in different processes).
+
+        :param num_partitions: int, maximum number of partitions.
+        :return: list, list of partitions descriptions.
+        """
+        shards = [
+            shard for shard in range(self.shard + 1)
+            if exists(self.get_shard_path(shard))
+        ]
+        size = max(1, -(-len(shards) // num_partitions))
+        return [shards[i:i + size] for i in range(0, len(shards), size)]
+
+    def iter_partition(self, partition):
+        """
+        Iterate over latest versions of records in partition.
+
+        :param partition: object, partition description.
+        :return: generator, generator of records.
+        """
+        for shard in partition:
+            with self.open_shard(shard, 'r') as f:
+                for line_number, line in enumerate(f):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        print(f'Skipping invalid line {line_number} of '
+                              f'shard {shard}.')
+                        continue
+                    stored = self.index.get(str(record[self.key]))
+                    if stored is not None \
+                            and stored[:2] == (shard, line_number):
+                        yield record
+
+    def close(self):
+        pass
+
+    def __contains__(self, record_id):
+        return str(record_id) in self.index
+
+    def __iter__(self):
+        for partition in self.get_partitions(1):
+            yield from self.iter_partition(partition)
+
+    def __len__(self):
+        return len(self.index)
+
+
+class SqliteStorage:
+    """
+    Storage of records in SQLite database.
+
+    :param path: str, path to SQLite database file.
+    :param key: str, attribute of record used as its id.
+    """
+
+    def __init__(self, path, key='id'):
+        self.path = path
+        self.key = key
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS records '
+            '(id TEXT PRIMARY KEY, data TEXT)'
+        )
+        self.connection.commit()
+
+    def save(self, records):
+        """
+        Save (insert or replace) records.
+
+        :param records: list, list of records (dictionaries).
+        """
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO records (id, data) VALUES (?, ?)',
+            ((str(record[self.key]), json.dumps(record)) for record in records)
+        )
+        self.connection.commit()
+
+    def get(self, record_id):
+        """
+        Get record by id.
+
+        :param record_id: object, id of record.
+        :return: dict, record (None if not stored).
+        """
+        row = self.connection.execute(
+            'SELECT data FROM records WHERE id = ?', (str(record_id),)
+        ).fetchone()
+
+        return None if row is None else json.loads(row[0])
+
+    def get_partitions(self, num_partitions):
+        """
+        Split stored records into partitions (ranges of row ids), which
+        can be read independently (e.g. in different processes).
+
+        :param num_partitions: int, maximum number of partitions.
+        :return: list, list of partitions descriptions.
+        """
+        low, high = self.connection.execute(
+            'SELECT MIN(rowid), MAX(rowid) FROM records'
+        ).fetchone()
+        if low is None:
+            return []
+
+        size = max(1, -(-(high - low + 1) // num_partitions))
+        return [
+            (start, min(start + size, high + 1))
+            for start in range(low, high + 1, size)
+        ]
+
+    def iter_partition(self, partition):
+        """
+        Iterate over records of partition.
+
+        :param partition: object, partition description.
+        :return: generator, generator of records.
+        """
+        rows = self.connection.execute(
+            'SELECT data FROM records WHERE rowid >= ? AND rowid < ? '
+            'ORDER BY rowid',
+            partition
+        )
+        for row in rows:
+            yield json.loads(row[0])
+
+    def close(self):
+        self.connection.close()
+
+    def __contains__(self, record_id):
+        return self.get(record_id) is not None
+
+    def __iter__(self):
+        for partition in self.get_partitions(1):
+            yield from self.iter_partition(partition)
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM records'
+        ).fetchone()[0]
+
+
+def get_storage(kind, folder, key='id'):
+    """
+    Get storage of records.
+
+    :param kind: str, kind of storage: 'json' (one JSON file per
+        record), 'jsonl' (JSON lines shards), 'jsonl.gz' (compressed
+        JSON lines shards) or 'sqlite' (SQLite database).
+    :param folder: str, folder where records are stored.
+    :param key: str, attribute of record used as its id.
+    :return: object, storage of records.
+    """
+    if kind == 'json':
+        return JsonFilesStorage(folder, key)
+    if kind == 'jsonl':
+        return JsonlShardsStorage(folder, key)
+    if kind == 'jsonl.gz':
+        return JsonlShardsStorage(folder, key, compress=True)
+    if kind == 'sqlite':
+        makedirs(folder, exist_ok=True)
+        return SqliteStorage(join(folder, 'records.sqlite'), key)
+
+    raise ValueError(f'Unknown storage kind: {kind}.')
@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+import requests
+from monant_data_client import CentralStorageClient
+from mock_server import start_mock_server
+
+
+def get_folder_size(folder):
+    """
+    Get total size of files in folder (recursively).
+
+    :param folder: str, path to folder.
+    :return: int, size in bytes.
+    """
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(folder)
+        for name in names
+    )
+
+
+def benchmark(
+        num_articles=10000,
+        page_size=200,
+        workers=1,
+        rate_limit=None,
+        storage='json',
+        latency=0.0,
+        error_rate=0.0,
+        server_rate_limit=None,
+        token_ttl=None,
+        data_folder=None
+):
+    """
+    Run synchronization of articles and annotations against mock Monant
+    platform API and measure its throughput.
+
+    :param num_articles: int, number of synthetic articles.
+    :param page_size: int, number of articles on one page.
+    :param workers: int, number of pages downloaded concurrently.
+    :param rate_limit: float, client rate limit (requests per second).
+    :param storage: str, kind of storage (see `get_storage`).
+    :param latency: float, delay (in seconds) of each server response.
+    :param error_rate: float, probability of 503 server response.
+    :param server_rate_limit: float, server rate limit (requests per
+        second), exceeding requests get 429 response.
+    :param token_ttl: float, time (in seconds) after which token expires.
+    :param data_folder: str, folder where data are stored (temporary
+        folder removed after benchmark if None).
+    :return: dict, measured results.
+    """
+    server = start_mock_server(
+        num_articles=num_articles,
+        latency=latency,
+        error_rate=error_rate,
+        rate_limit=server_rate_limit,
+        token_ttl=token_ttl
+    )
+    host, port = server.server_address
+    folder = data_folder or tempfile.mkdtemp(prefix='monant_benchmark_')
+
+    try:
+        CentralStorageClient.token = None
+        client = CentralStorageClient(
+            username='benchmark',
+            password='benchmark',
+            api_host=f'http://{host}:{port}',
+            data_folder=folder,
+            workers=workers,
+            rate_limit=rate_limit,
+            backoff=0.1,
+            storage=storage
+        )
+
+        error = None
+        start = time.perf_counter()
+        try:
+            client.get_data(size=page_size, resume=False)
+        except (RuntimeError, requests.RequestException) as e:
+            # Throughput of partial synchronization is still reported
+            error = str(e)
+        articles_time = time.perf_counter() - start
+
+        annotations_time = None
+        if error is None:
+            start = time.perf_counter()
+            client.save_annotations()
+            annotations_time = time.perf_counter() - start
+
+        num_stored = len(client.articles_storage)
+        client.articles_storage.close()
+        client.annotations_storage.close()
+
+        sync_stats = client.sync_stats
+        stats = server.RequestHandlerClass.stats
+        results = {
+            'error': error,
+            'pages': sync_stats['pages'],
+            'articles_fetched': sync_stats['fetched'],
+            'articles': num_stored,
+            'articles_time': articles_time,
+            'annotations_time': annotations_time,
+            'pages_per_second': sync_stats['pages'] / articles_time,
+            'articles_per_second': num_stored / articles_time,
+            'bytes_received': stats['bytes'],
+            'bytes_written': get_folder_size(folder),
+            'responses': {
+                status: count for status, count in stats.items()
+                if status != 'bytes'
+            }
+        }
+    finally:
+        server.shutdown()
+        server.server_close()
+        if data_folder is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    return results
+
+
+def parse_arguments():
+    """
+    Parse script call arguments.
+
+    :return: argparse.Namespace, arguments namespace object.
+    """
+    parser = ArgumentParser()
+
+    parser.add_argument("-a", "--articles", dest="num_articles",
+                        default=10000, type=int,
+                        help="Number of synthetic articles.")
+    parser.add_argument("-ps", "--page-size", dest="page_size", default=200,
+                        type=int, help="Number of articles on one page.")
+    parser.add_argument("-w", "--workers", dest="workers", default=1,
+                        type=int,
+                        help="Number of pages downloaded concurrently.")
+    parser.add_argument("-r", "--rate-limit", dest="rate_limit",
+                        default=None, type=float,
+                        help="Client rate limit (requests per second).")
+    parser.add_argument("-s", "--storage", dest="storage", default='json',
+                        help="Storage of articles (json, jsonl, jsonl.gz "
+                             "or sqlite).")
+    parser.add_argument("-l", "--latency", dest="latency", default=0,
+                        type=float,
+                        help="Latency (in milliseconds) of each request.")
+    parser.add_argument("-e", "--error-rate", dest="error_rate", default=0,
+                        type=float, help="Rate of requests failed with 503.")
+    parser.add_argument("-sr", "--server-rate-limit",
+                        dest="server_rate_limit", default=None, type=float,
+                        help="Server rate limit (requests per second).")
+    parser.add_argument("-t", "--token-ttl", dest="token_ttl", default=None,
+                        type=float,
+                        help="Time (in seconds) after which token expires.")
+    parser.add_argument("-d", "--data-folder", dest="data_folder",
+                        default=None,
+                        help="Folder where data are stored (temporary "
+                             "folder by default).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    results = benchmark(
+        num_articles=args.num_articles,
+        page_size=args.page_size,
+        workers=args.workers,
+        rate_limit=args.rate_limit,
+        storage=args.storage,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        server_rate_limit=args.server_rate_limit,
+        token_ttl=args.token_ttl,
+        data_folder=args.data_folder
+    )
+
+    print()
+    if results['error'] is not None:
+        print(f'Synchronization failed: {results["error"]}')
+    print(f'Articles: {results["articles"]} stored of '
+          f'{results["articles_fetched"]} fetched in {results["pages"]} '
+          f'pages ({results["articles_time"]:.2f} s)')
+    if results['annotations_time'] is not None:
+        print(f'Annotations: {results["annotations_time"]:.2f} s')
+    print(f'Pages/sec: {results["pages_per_second"]:.2f}')
+    print(f'Articles/sec: {results["articles_per_second"]:.2f}')
+    print(f'Bytes received: {results["bytes_received"]}')
+    print(f'Bytes written: {results["bytes_written"]}')
+    print(f'Responses: {results["responses"]}')
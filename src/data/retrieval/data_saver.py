@@ -22,13 +22,23 @@ def main():
         username=config['username'],
         password=config['password'],
         api_host=config['api_host'],
-        data_folder=config['data_folder']
+        data_folder=config['data_folder'],
+        workers=config.get('workers', 1),
+        rate_limit=config.get('rate_limit', 0.4),
+        max_retries=config.get('max_retries', 5),
+        timeout=config.get('timeout', (10.0, 60.0)),
+        storage=config.get('storage', 'json')
     )
     client.get_data()
     client.save_annotations()
 
     # Annotate articles
-    annotate_articles(data_folder=config['data_folder'])
+    annotate_articles(
+        data_folder=config['data_folder'],
+        storage=config.get('storage', 'json'),
+        output_format=config.get('dataset_format', 'jsonl'),
+        n_jobs=config.get('n_jobs', 1)
+    )
 
 
 if __name__ == "__main__":
@@ -1,45 +1,150 @@
+import csv
 import json
-import os
+import shutil
+from multiprocessing import Pool, cpu_count
+from os import remove
+from article_storage import get_storage
 
+# Columns of annotated dataset (in order expected by `read_data`)
+DATASET_COLUMNS = [
+    'id', 'title', 'perex', 'body', 'author', 'image', 'source', 'label'
+]
 
-def get_annotations(data_folder):
+# Annotations dictionary used by worker processes
+_annotations = None
+
+
+def get_annotations(data_folder, storage='json'):
     """
-    Return annotations dictionary from json files.
+    Return annotations dictionary from annotations storage.
 
     :param data_folder: str, folder where data are stored.
+    :param storage: str, kind of storage (see `get_storage`).
     :return: dict, annotations dictionary.
     """
-    annotations_files = os.listdir('data_annotations')
+    annotations_storage = get_storage(
+        storage, f'{data_folder}/annotations', key='entity_id'
+    )
 
     annotations = {}
-    for file_name in annotations_files:
-        annotation = json.load(
-            open(f'{data_folder}/annotations/{file_name}', 'r')
-        )
+    for annotation in annotations_storage:
         key = int(annotation['entity_id'])
         annotations[key] = annotation['value']['value']
 
+    annotations_storage.close()
+
     return annotations
 
 
-def annotate_articles(data_folder):
+def set_annotations(annotations):
+    global _annotations
+    _annotations = annotations
+
+
+def write_articles(articles, f, output_format='jsonl'):
+    """
+    Annotate articles and write them one by one into opened file.
+
+    :param articles: iterable, articles (dictionaries) from storage.
+    :param f: file, opened output file.
+    :param output_format: str, format of output ('jsonl' or 'csv').
+    :return: int, number of written articles.
+    """
+    writer = csv.writer(f) if output_format == 'csv' else None
+
+    count = 0
+    for article in articles:
+        article['label'] = _annotations.get(article['source']['id'], None)
+        article = filter_data(article)
+
+        if writer is not None:
+            writer.writerow(article[column] for column in DATASET_COLUMNS)
+        else:
+            f.write(f'{json.dumps(article)}\n')
+        count += 1
+
+    return count
+
+
+def annotate_partition(storage, data_folder, partition, output_path,
+                       output_format='jsonl'):
     """
-    Annotate articles using annotations json files.
+    Annotate articles of one storage partition into separate file.
 
+    :param storage: str, kind of storage (see `get_storage`).
     :param data_folder: str, folder where data are stored.
+    :param partition: object, partition description (see
+        `get_partitions` of storage).
+    :param output_path: str, path to output file of partition.
+    :param output_format: str, format of output ('jsonl' or 'csv').
+    :return: int, number of written articles.
     """
-    articles_files = os.listdir('data')
-    annotations = get_annotations()
-    
-    all_articles = {}
-    for index, file_name in enumerate(articles_files):
-        article = json.load(open(f'{data_folder}/articles/{file_name}', 'r'))
-        print(f'{index} - {article["source"]["id"]}')
-        article['label'] = annotations.get(article['source']['id'], None)
-        all_articles[article['id']] = filter_data(article)
-
-    with open(f'{data_folder}/dataset.json', 'w') as f:
-        json.dump(all_articles, f)
+    articles_storage = get_storage(storage, f'{data_folder}/articles')
+    with open(output_path, 'w', newline='') as f:
+        count = write_articles(
+            articles_storage.iter_partition(partition), f, output_format
+        )
+    articles_storage.close()
+
+    return count
+
+
+def annotate_articles(data_folder, storage='json', output_format='jsonl',
+                      n_jobs=1):
+    """
+    Annotate articles using annotations from storage.
+
+    Articles are streamed from storage and written one by one into
+    `dataset.jsonl` (or `dataset.csv`) in data folder, so memory usage
+    does not grow with number of articles. With multiple processes,
+    each storage partition is written into its own part file and parts
+    are concatenated in order of partitions.
+
+    :param data_folder: str, folder where data are stored.
+    :param storage: str, kind of storage (see `get_storage`).
+    :param output_format: str, format of output ('jsonl' or 'csv').
+    :param n_jobs: int, number of processes (all CPUs if -1).
+    :return: str, path to annotated dataset.
+    """
+    if output_format not in ('jsonl', 'csv'):
+        raise ValueError(f'Unknown output format: {output_format}.')
+
+    n_jobs = cpu_count() if n_jobs == -1 else (n_jobs or 1)
+    output_path = f'{data_folder}/dataset.{output_format}'
+    annotations = get_annotations(data_folder, storage)
+
+    with open(output_path, 'w', newline='') as f:
+        if output_format == 'csv':
+            csv.writer(f).writerow(DATASET_COLUMNS)
+
+        articles_storage = get_storage(storage, f'{data_folder}/articles')
+        if n_jobs <= 1:
+            set_annotations(annotations)
+            count = write_articles(articles_storage, f, output_format)
+            articles_storage.close()
+        else:
+            partitions = articles_storage.get_partitions(n_jobs * 4)
+            articles_storage.close()
+
+            parts_paths = [
+                f'{output_path}.part-{i:05d}' for i in range(len(partitions))
+            ]
+            with Pool(n_jobs, set_annotations, (annotations,)) as pool:
+                counts = pool.starmap(annotate_partition, [
+                    (storage, data_folder, partition, part_path,
+                     output_format)
+                    for partition, part_path in zip(partitions, parts_paths)
+                ])
+            count = sum(counts)
+
+            for part_path in parts_paths:
+                with open(part_path, 'r', newline='') as part:
+                    shutil.copyfileobj(part, f)
+                remove(part_path)
+
+    print(f'Annotated {count} articles into {output_path}.')
+
+    return output_path
 
 
 def get_image(article):
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+from monant_data_client import RateLimiter
+
+WORDS = [
+    'government', 'election', 'vaccine', 'president', 'study', 'report',
+    'claims', 'official', 'people', 'health', 'market', 'police', 'city',
+    'new', 'said', 'according', 'shows', 'secret', 'million', 'world'
+]
+
+
+def generate_article(article_id, num_sources=50, body_words=400):
+    """
+    Generate synthetic article (deterministic for its id).
+
+    :param article_id: int, id of article.
+    :param num_sources: int, number of sources articles are taken from.
+    :param body_words: int, average number of words in article body.
+    :return: dict, article object in format of Monant platform.
+    """
+    generator = random.Random(article_id)
+    source_id = generator.randrange(num_sources)
+    extracted_at = datetime(2019, 1, 1) + timedelta(minutes=article_id)
+
+    sentences = []
+    for _ in range(max(1, generator.randint(body_words // 2,
+                                            body_words * 3 // 2) // 12)):
+        words = generator.choices(WORDS, k=12)
+        sentences.append(' '.join(words).capitalize() + '.')
+
+    return {
+        'id': article_id,
+        'title': ' '.join(generator.choices(WORDS, k=8)).capitalize(),
+        'perex': sentences[0],
+        'body': ' '.join(sentences),
+        'author': {'name': f'Author {generator.randrange(100)}'}
+        if generator.random() < 0.8 else None,
+        'media': [{
+            'media_type': {'name': 'image'},
+            'url': f'https://example.com/images/{article_id}.jpg'
+        }],
+        'source': {'id': source_id, 'name': f'Source {source_id}'},
+        'extracted_at': extracted_at.isoformat()
+    }
+
+
+def generate_annotation(source_id):
+    """
+    Generate synthetic source reliability annotation.
+
+    :param source_id: int, id of annotated source.
+    :return: dict, annotation object in format of Monant platform.
+    """
+    return {
+        'entity_id': source_id,
+        'value': {
+            'value': 'unreliable' if source_id % 3 == 0 else 'reliable'
+        }
+    }
+
+
+class MockMonantRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of requests to mock Monant platform API.
+
+    Endpoints:
+    - POST /auth - get access token (expires after `token_ttl`).
+    - GET /v1/articles - page of synthetic articles (`page`, `size`).
+    - GET /v1/entity-annotations - page of source reliability
+        annotations (`page`, `size`), with ETag support.
+
+    GET requests are delayed by `latency`, fail with 503 status with
+    probability `error_rate`, fail with 429 status above `rate_limit`
+    and fail with 401 status with expired or unknown token.
+    """
+
+    num_articles = 10000
+    num_sources = 50
+    body_words = 400
+    latency = 0.0
+    error_rate = 0.0
+    rate_limiter = RateLimiter()
+    token_ttl = None
+
+    tokens = {}
+    stats = Counter()
+    lock = threading.Lock()
+
+    def send_json(self, status, data=None, headers=None):
+        body = b'' if data is None else json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+        with self.lock:
+            self.stats[status] += 1
+            self.stats['bytes'] += len(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        if urlparse(self.path).path != '/auth':
+            self.send_json(404, {'error': 'Not found.'})
+            return
+
+        with self.lock:
+            token = f'token-{len(self.tokens)}'
+            self.tokens[token] = time.monotonic()
+
+        self.send_json(200, {'access_token': token})
+
+    def is_authorized(self):
+        authorization = self.headers.get('Authorization', '')
+        token = authorization[len('JWT '):]
+        issued_at = self.tokens.get(token)
+
+        if issued_at is None:
+            return False
+        return self.token_ttl is None \
+            or time.monotonic() - issued_at < self.token_ttl
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        page = int(query.get('page', ['1'])[0])
+        size = int(query.get('size', ['20'])[0])
+
+        if url.path == '/v1/articles':
+            get_page = self.get_articles_page
+        elif url.path == '/v1/entity-annotations':
+            get_page = self.get_annotations_page
+        else:
+            self.send_json(404, {'error': 'Not found.'})
+            return
+
+        wait = self.rate_limiter.try_acquire()
+        if wait > 0:
+            self.send_json(429, {'error': 'Too many requests.'},
+                           {'Retry-After': f'{wait:.3f}'})
+            return
+
+        if not self.is_authorized():
+            self.send_json(401, {'error': 'Invalid token.'})
+            return
+
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            self.send_json(503, {'error': 'Service unavailable.'})
+            return
+
+        data = get_page(page, size)
+        etag = '"' + hashlib.sha1(
+            json.dumps(data).encode('utf-8')
+        ).hexdigest() + '"'
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_json(304, headers={'ETag': etag})
+            return
+
+        self.send_json(200, data, {'ETag': etag})
+
+    def get_articles_page(self, page, size):
+        start = (page - 1) * size
+        end = min(page * size, self.num_articles)
+
+        return {
+            'articles': [
+                generate_article(article_id, self.num_sources,
+                                 self.body_words)
+                for article_id in range(start, end)
+            ],
+            'pagination': {
+                'page': page,
+                'size': size,
+                'has_next': end < self.num_articles
+            }
+        }
+
+    def get_annotations_page(self, page, size):
+        start = (page - 1) * size
+        end = min(page * size, self.num_sources)
+
+        return {
+            'entity_annotations': [
+                generate_annotation(source_id)
+                for source_id in range(start, end)
+            ],
+            'pagination': {
+                'page': page,
+                'size': size,
+                'has_next': end < self.num_sources
+            }
+        }
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockMonantServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request in separate thread."""
+
+    daemon_threads = True
+
+
+def start_mock_server(
+        host='127.0.0.1',
+        port=0,
+        num_articles=10000,
+        num_sources=50,
+        body_words=400,
+        latency=0.0,
+        error_rate=0.0,
+        rate_limit=None,
+        token_ttl=None
+):
+    """
+    Start mock Monant platform API server in background thread.
+
+    :param host: str, host to listen on.
+    :param port: int, port to listen on (any free port if 0).
+    :param num_articles: int, number of synthetic articles.
+    :param num_sources: int, number of synthetic sources (annotations).
+    :param body_words: int, average number of words in article body.
+    :param latency: float, delay (in seconds) of each GET request.
+    :param error_rate: float, probability of 503 response.
+    :param rate_limit: float, maximum number of GET requests per second
+        (no limit if None).
+    :param token_ttl: float, time (in seconds) after which token expires
+        (never if None).
+    :return: MockMonantServer, running server (`server_address` contains
+        its host and port, `RequestHandlerClass.stats` counts responses
+        by status and bytes sent).
+    """
+    handler = type('MockMonantRequestHandler', (MockMonantRequestHandler,), {
+        'num_articles': num_articles,
+        'num_sources': num_sources,
+        'body_words': body_words,
+        'latency': latency,
+        'error_rate': error_rate,
+        'rate_limiter': RateLimiter(rate_limit),
+        'token_ttl': token_ttl,
+        'tokens': {},
+        'stats': Counter(),
+        'lock': threading.Lock()
+    })
+
+    server = MockMonantServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def parse_arguments():
+    """
+    Parse script call arguments.
+
+    :return: argparse.Namespace, arguments namespace object.
+    """
+    parser = ArgumentParser()
+
+    parser.add_argument("--host", dest="host", default='127.0.0.1',
+                        help="Host to listen on.")
+    parser.add_argument("-p", "--port", dest="port", default=5000, type=int,
+                        help="Port to listen on.")
+    parser.add_argument("-a", "--articles", dest="num_articles",
+                        default=10000, type=int,
+                        help="Number of synthetic articles.")
+    parser.add_argument("-s", "--sources", dest="num_sources", default=50,
+                        type=int, help="Number of synthetic sources.")
+    parser.add_argument("-l", "--latency", dest="latency", default=0,
+                        type=float,
+                        help="Latency (in milliseconds) of each request.")
+    parser.add_argument("-e", "--error-rate", dest="error_rate", default=0,
+                        type=float, help="Rate of requests failed with 503.")
+    parser.add_argument("-r", "--rate-limit", dest="rate_limit",
+                        default=None, type=float,
+                        help="Maximum number of requests per second.")
+    parser.add_argument("-t", "--token-ttl", dest="token_ttl", default=None,
+                        type=float,
+                        help="Time (in seconds) after which token expires.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    server = start_mock_server(
+        host=args.host,
+        port=args.port,
+        num_articles=args.num_articles,
+        num_sources=args.num_sources,
+        latency=args.latency / 1000,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        token_ttl=args.token_ttl
+    )
+    print(f'Mock Monant API running on http://{args.host}:{args.port}')
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
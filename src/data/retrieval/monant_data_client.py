@@ -1,34 +1,176 @@
 import requests
 import json
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from os.path import exists
-from os import mkdir
+from os import replace
+from requests.adapters import HTTPAdapter
+from article_storage import get_storage
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket rate limiter.
+
+    When server rejects request for exceeding its rate limit, all
+    requests are paused (see `throttle`) and rate is halved, it is then
+    raised back towards configured rate with each successful request
+    (see `recover`).
+
+    :param rate: float, number of allowed requests per second (no
+        limit if None).
+    :param burst: int, maximum number of requests allowed at once.
+    :param min_rate: float, minimum rate the limiter slows down to.
+    """
+
+    def __init__(self, rate=None, burst=1, min_rate=0.05):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate if rate is None else min(min_rate, rate)
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Take one request from rate limit without waiting.
+
+        :return: float, time (in seconds) to wait for next request (0 if
+            request is allowed).
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+
+            if self.rate is None:
+                return 0
+
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Wait until request is allowed by rate limit."""
+        wait = self.try_acquire()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+    def throttle(self, wait=0):
+        """
+        Slow down after request was rejected for exceeding rate limit.
+
+        All requests are paused for `wait` seconds and rate is halved
+        (only once for requests rejected during the same pause).
+
+        :param wait: float, time (in seconds) to pause requests for.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.blocked_until and self.rate is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0)
+            self.blocked_until = max(self.blocked_until, now + wait)
+
+    def recover(self):
+        """Raise rate back towards configured rate after success."""
+        if self.rate is None or self.rate >= self.max_rate:
+            return
+
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
 
 
 class CentralStorageClient:
     """
     Client to perform authorized requests on Monant platform.
 
+    Requests are sent through shared pooled session under token bucket
+    rate limit. Requests failed with 5xx status are retried with
+    exponential backoff and expired token is renewed transparently.
+    Requests rejected with 429 status are repeated after Retry-After
+    (they do not count as failures) and rate limit is lowered.
+
     :param token: str (static), token to be used in authorization.
     :param username: str, username for authorization to central storage.
     :param password: str, password for authorization to central storage.
     :param api_host: str, url of Monant platform API.
     :param data_folder: str, path of folder where data will be stored.
+    :param workers: int, number of pages downloaded concurrently.
+    :param rate_limit: float, maximum number of requests per second (no
+        limit if None).
+    :param max_retries: int, maximum number of retries of failed request.
+    :param max_rate_limited: int, maximum number of repetitions of
+        request rejected with 429 status.
+    :param backoff: float, initial backoff (in seconds) between retries,
+        doubled after each retry.
+    :param timeout: tuple, connect and read timeout (in seconds) of each
+        request.
+    :param storage: str, kind of storage of articles and annotations
+        (see `article_storage.get_storage`).
     """
     token = None
+    token_lock = threading.Lock()
+
+    RETRY_STATUSES = {500, 502, 503, 504}
 
-    def __init__(self, username, password, api_host, data_folder):
+    def __init__(
+            self,
+            username,
+            password,
+            api_host,
+            data_folder,
+            workers=1,
+            rate_limit=0.4,
+            max_retries=5,
+            max_rate_limited=100,
+            backoff=1.0,
+            timeout=(10.0, 60.0),
+            storage='json'
+    ):
         """Create object of the class CentralStorageClient."""
         self.username = username
         self.password = password
         self.api_host = api_host
         self.data_folder = data_folder
+        self.workers = workers
+        # Numbers of processed pages and fetched and saved articles of the
+        # last (or running) synchronization of articles
+        self.sync_stats = {'pages': 0, 'fetched': 0, 'saved': 0}
+        self.max_retries = max_retries
+        self.max_rate_limited = max_rate_limited
+        self.backoff = backoff
+        self.timeout = tuple(timeout)
+        self.rate_limiter = RateLimiter(rate_limit, burst=workers)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(workers, 10)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
-        if not exists(f'{self.data_folder}/articles'):
-            mkdir(f'{self.data_folder}/articles')
-
-        if not exists(f'{self.data_folder}/annotations'):
-            mkdir(f'{self.data_folder}/annotations')
+        self.articles_storage = get_storage(
+            storage, f'{self.data_folder}/articles'
+        )
+        self.annotations_storage = get_storage(
+            storage, f'{self.data_folder}/annotations', key='entity_id'
+        )
 
         if not CentralStorageClient.is_authorized():
             self.authorize()
@@ -54,7 +196,11 @@ class CentralStorageClient:
             'username': self.username,
             'password': self.password,
         }
-        r = requests.post(f'{self.api_host}/auth', json=login_data)
+        r = self.session.post(
+            f'{self.api_host}/auth',
+            json=login_data,
+            timeout=self.timeout
+        )
 
         if r.status_code == 200:
             CentralStorageClient.token = r.json()['access_token']
@@ -74,7 +220,9 @@ class CentralStorageClient:
         :return: str, authorization token.
         """
         if not CentralStorageClient.is_authorized():
-            self.authorize()
+            with CentralStorageClient.token_lock:
+                if not CentralStorageClient.is_authorized():
+                    self.authorize()
 
         return CentralStorageClient.token
 
@@ -88,38 +236,268 @@ class CentralStorageClient:
             'Authorization': 'JWT ' + self.get_authorization_token()
         }
 
-    def get_data(self):
+    def renew_authorization(self, expired_token):
+        """
+        Authorize client again if token has expired.
+
+        Only the first thread which found out that token has expired
+        performs authorization, other threads use the new token.
+
+        :param expired_token: str, token rejected by Monant platform.
+        :return: bool, result of authorization.
+        """
+        with CentralStorageClient.token_lock:
+            if CentralStorageClient.token != expired_token:
+                return True
+            CentralStorageClient.token = None
+            return self.authorize()
+
+    @staticmethod
+    def get_retry_after(response, default):
+        """
+        Get time to wait before next request from Retry-After header.
+
+        :param response: requests.Response, response of failed request.
+        :param default: float, time used if header is missing or invalid.
+        :return: float, time (in seconds) to wait.
+        """
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is None:
+            return default
+
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+
+        try:
+            # Retry-After can also be HTTP date
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp()
+                       - time.time())
+        except (TypeError, ValueError):
+            return default
+
+    def request(self, method, url, **kwargs):
+        """
+        Perform authorized request under rate limit.
+
+        Request is retried with exponential backoff if it fails with 5xx
+        status (or connection error or timeout) and repeated with new
+        token if token has expired (401 status). Request rejected for
+        exceeding rate limit (429 status) is repeated after Retry-After,
+        separately from retries of failed request, and rate limit is
+        lowered.
+
+        :param method: str, HTTP method.
+        :param url: str, url of request.
+        :param kwargs: dict, other arguments of request.
+        :return: requests.Response, response of the last attempt.
+        """
+        headers = kwargs.pop('headers', {})
+        kwargs.setdefault('timeout', self.timeout)
+        backoff = self.backoff
+        reauthorized = False
+        num_retries = 0
+        num_rate_limited = 0
+
+        while True:
+            token = self.get_authorization_token()
+            self.rate_limiter.acquire()
+
+            try:
+                r = self.session.request(
+                    method,
+                    url,
+                    headers={**headers, 'Authorization': f'JWT {token}'},
+                    **kwargs
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if num_retries == self.max_retries:
+                    raise
+                num_retries += 1
+                time.sleep(backoff)
+                backoff *= 2
+                continue
+
+            if r.status_code == 401 and not reauthorized:
+                reauthorized = True
+                if self.renew_authorization(token):
+                    continue
+
+            if r.status_code == 429 \
+                    and num_rate_limited < self.max_rate_limited:
+                num_rate_limited += 1
+                self.rate_limiter.throttle(
+                    self.get_retry_after(r, self.backoff)
+                )
+                continue
+
+            if r.status_code in self.RETRY_STATUSES \
+                    and num_retries < self.max_retries:
+                num_retries += 1
+                time.sleep(self.get_retry_after(r, backoff))
+                backoff *= 2
+                continue
+
+            if r.status_code < 400:
+                self.rate_limiter.recover()
+
+            return r
+
+    def get_articles_page(self, page, size=200):
+        """
+        Get one page of articles ordered by extraction time.
+
+        :param page: int, page to be returned.
+        :param size: int, number of articles on page.
+        :return: dict, list of articles and pagination.
+        """
+        response = self.get_articles(
+            page=page,
+            size=size,
+            order_by='extracted_at',
+            order_type='asc'
+        )
+
+        if response is None:
+            raise RuntimeError(f'Failed to get page {page} of articles.')
+
+        return response
+
+    def get_checkpoint_path(self):
+        return f'{self.data_folder}/sync_checkpoint.json'
+
+    def load_checkpoint(self):
         """
-        Get articles data from Monant platform and save to JSON files.
+        Load synchronization checkpoint.
+
+        :return: dict, checkpoint with last processed page, page size and
+            extraction time of last saved article (None if not exists).
         """
-        has_next_page = True
-        page = 1
-        while has_next_page:
-            print(f'Getting page {page}')
-            response = self.get_articles(
-                    page=page,
-                    size=200,
-                    order_by='extracted_at',
-                    order_type='asc'
+        if not exists(self.get_checkpoint_path()):
+            return None
+
+        with open(self.get_checkpoint_path(), 'r') as f:
+            return json.load(f)
+
+    def save_checkpoint(self, page, size, extracted_at):
+        """
+        Save synchronization checkpoint.
+
+        Checkpoint is written into temporary file at first and then
+        replaced, so crash during writing never corrupts it.
+
+        :param page: int, last processed page.
+        :param size: int, number of articles on one page.
+        :param extracted_at: str, extraction time of last saved article.
+        """
+        tmp_path = f'{self.get_checkpoint_path()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(
+                {'page': page, 'size': size, 'extracted_at': extracted_at},
+                f
             )
-            pagination = response.get('pagination')
-            has_next_page = pagination.get('has_next')
-            self.save_articles(response.get('articles'))
-            page += 1
-            time.sleep(2.5)
+        replace(tmp_path, self.get_checkpoint_path())
+
+    def get_data(self, size=200, resume=True):
+        """
+        Get articles data from Monant platform and save them to storage.
+
+        Up to `workers` pages are downloaded concurrently, but they are
+        processed (saved) in order of pages. After each page, checkpoint
+        is saved, so next synchronization (or synchronization after
+        crash) continues from the last processed page and only articles
+        extracted since the checkpoint are saved. Numbers of processed
+        pages and fetched and saved articles are kept in `sync_stats`, so
+        they are known also if synchronization fails.
+
+        :param size: int, number of articles on one page.
+        :param resume: bool, whether to continue from checkpoint.
+        :return: dict, numbers of processed pages and fetched and saved
+            articles.
+        """
+        self.sync_stats = {'pages': 0, 'fetched': 0, 'saved': 0}
+        checkpoint = self.load_checkpoint() if resume else None
+
+        first_page = 1
+        extracted_at = None
+        if checkpoint is not None:
+            # Last processed page is downloaded again, as new articles
+            # could be added to it since the checkpoint
+            first_page = (checkpoint['page'] - 1) * checkpoint['size'] \
+                // size + 1
+            extracted_at = checkpoint['extracted_at']
+            print(f'Resuming from page {first_page} (articles extracted '
+                  f'since {extracted_at}).')
+
+        pages = self.iter_pages(
+            lambda page: self.get_articles_page(page, size),
+            lambda page, response: response['pagination'].get('has_next'),
+            first_page
+        )
+        for page, response in pages:
+            print(f'Got page {page}')
+
+            articles = [
+                article for article in response.get('articles')
+                if extracted_at is None
+                or article.get('extracted_at') is None
+                or article['extracted_at'] >= extracted_at
+            ]
+            self.save_articles(articles)
+
+            if len(articles):
+                extracted_at = articles[-1].get('extracted_at')
+            self.save_checkpoint(page, size, extracted_at)
+
+            self.sync_stats['pages'] += 1
+            self.sync_stats['fetched'] += len(response.get('articles'))
+            self.sync_stats['saved'] += len(articles)
+
+        return self.sync_stats
+
+    def iter_pages(self, get_page, has_next, first_page=1):
+        """
+        Download pages concurrently and yield them in order of pages.
+
+        Up to `workers` pages are downloaded at once. Next page is
+        checked (by `has_next`) only after the previous one has been
+        processed by caller.
+
+        :param get_page: callable, function returning page by its number.
+        :param has_next: callable, function called with number of page
+            and page itself, returning whether next page exists.
+        :param first_page: int, number of the first page.
+        :return: generator, generator of (number of page, page) tuples.
+        """
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = deque()
+            next_page = first_page
+
+            while True:
+                while len(futures) < self.workers:
+                    futures.append(
+                        (next_page, executor.submit(get_page, next_page))
+                    )
+                    next_page += 1
+
+                page, future = futures.popleft()
+                result = future.result()
+                yield page, result
+
+                if not has_next(page, result):
+                    break
+
+            for _, future in futures:
+                future.cancel()
 
     def save_articles(self, articles):
         """
-        Save articles into JSON files.
+        Save articles into storage.
 
         :param articles: dict, articles objects.
         """
-        for article in articles:
-            with open(
-                    f'{self.data_folder}/articles/{article.get("id")}.json',
-                    'w'
-            ) as f:
-                json.dump(article, f)
+        self.articles_storage.save(articles)
 
     def get_articles(
             self,
@@ -151,10 +529,10 @@ class CentralStorageClient:
 
         params_str = "&".join(f'{k}={v}' for k, v in params.items())
 
-        r = requests.get(
+        r = self.request(
+            'GET',
             f'{self.api_host}/v1/articles',
-            params=params_str,
-            headers=self.get_request_headers()
+            params=params_str
         )
 
         response = None
@@ -163,23 +541,111 @@ class CentralStorageClient:
 
         return response
 
-    def save_annotations(self):
+    def get_annotations_page(self, page, size=100, etag=None):
         """
-        Get entity annotations from Monant platform and save them to
-        JSON files.
+        Get one page of source reliability annotations.
+
+        :param page: int, page to be returned.
+        :param size: int, number of annotations on page.
+        :param etag: str, ETag of page from previous synchronization
+            (response has 304 status if page has not been modified).
+        :return: requests.Response, response with page of annotations.
         """
-        r = requests.get(
-            f'{self.api_host}/v1/entity-annotations?'
-            f'annotation_type=Source reliability (binary)&size=100',
-            headers=self.get_request_headers()
+        headers = {'If-None-Match': etag} if etag is not None else {}
+        r = self.request(
+            'GET',
+            f'{self.api_host}/v1/entity-annotations',
+            params={
+                'annotation_type': 'Source reliability (binary)',
+                'size': size,
+                'page': page
+            },
+            headers=headers
         )
 
-        entity_annotations = r.json().get('entity_annotations')
+        if r.status_code not in (200, 304):
+            raise RuntimeError(f'Failed to get page {page} of annotations.')
+
+        return r
+
+    def get_annotations_etags_path(self):
+        return f'{self.data_folder}/annotations_etags.json'
+
+    def load_annotations_etags(self, size):
+        """
+        Load ETags and pagination of annotations pages from previous
+        synchronization.
+
+        :param size: int, number of annotations on one page.
+        :return: dict, dictionary of format 'page: {etag, has_next}'
+            (empty if not exists or pages had different size).
+        """
+        if not exists(self.get_annotations_etags_path()):
+            return {}
+
+        with open(self.get_annotations_etags_path(), 'r') as f:
+            etags = json.load(f)
+
+        return etags['pages'] if etags['size'] == size else {}
+
+    def save_annotations_etags(self, pages, size):
+        """
+        Save ETags and pagination of annotations pages.
+
+        :param pages: dict, dictionary of format 'page: {etag, has_next}'.
+        :param size: int, number of annotations on one page.
+        """
+        tmp_path = f'{self.get_annotations_etags_path()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'size': size, 'pages': pages}, f)
+        replace(tmp_path, self.get_annotations_etags_path())
+
+    def save_annotations(self, size=100):
+        """
+        Get all pages of entity annotations from Monant platform and
+        save them to storage.
+
+        Pages are downloaded concurrently under the same rate limit as
+        articles. Pages not modified since previous synchronization (by
+        their ETag) are not downloaded again and unchanged annotations
+        are not rewritten in storage.
+
+        :param size: int, number of annotations on one page.
+        """
+        pages = self.load_annotations_etags(size)
+
+        def get_page(page):
+            etag = pages.get(str(page), {}).get('etag')
+            return self.get_annotations_page(page, size, etag)
+
+        last_page = 0
+        num_annotations = 0
+        for page, r in self.iter_pages(
+                get_page,
+                lambda page, _: pages[str(page)]['has_next']
+        ):
+            last_page = page
+            if r.status_code == 304:
+                print(f'Page {page} of annotations not modified')
+                continue
+
+            response = r.json()
+            entity_annotations = response.get('entity_annotations')
+            self.annotations_storage.save(entity_annotations)
+            num_annotations += len(entity_annotations)
+
+            pages[str(page)] = {
+                'etag': r.headers.get('ETag'),
+                'has_next': response['pagination'].get('has_next')
+            }
+            print(f'Got page {page} of annotations')
+
+        # Forget pages which no longer exist
+        pages = {
+            page: value for page, value in pages.items()
+            if int(page) <= last_page
+        }
+        self.save_annotations_etags(pages, size)
 
-        for annotation in entity_annotations:
-            annotation_id = annotation.get('entity_id')
-            with open(
-                    f'{self.data_folder}/annotations/{annotation_id}.json',
-                    'w'
-            ) as f:
-                json.dump(annotation, f)
+        print(f'Saved {num_annotations} annotations from {last_page} '
+              f'pages.')
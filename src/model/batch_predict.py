@@ -0,0 +1,343 @@
+import csv
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from itertools import islice
+import numpy as np
+import pandas as pd
+from predict import load_model, load_word_index, get_texts_dataframe, \
+    get_sequences, get_windowing, predict_windowed, add_windowing_arguments, \
+    get_max_seq_len
+from inference import CompiledPredictor, get_bucket_lengths, \
+    get_inference_mode
+from prediction_cache import PredictionCache, get_model_id, predict_cached
+
+
+def iter_csv(path, column='body', id_column=None, chunk_size=1000):
+    """
+    Iterate over texts in csv file.
+
+    :param path: str, path to csv file.
+    :param column: str, name of column with texts.
+    :param id_column: str, name of column with ids (row number if None).
+    :param chunk_size: int, number of rows read at once.
+    :return: generator, generator of (id, text) tuples.
+    """
+    row = 0
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        ids = chunk[id_column] if id_column is not None \
+            else range(row, row + len(chunk))
+        for sample_id, text in zip(ids, chunk[column]):
+            yield sample_id, text
+        row += len(chunk)
+
+
+def iter_jsonl(path, column='body', id_column=None):
+    """
+    Iterate over texts in JSON lines file.
+
+    :param path: str, path to JSON lines file.
+    :param column: str, name of attribute with texts.
+    :param id_column: str, name of attribute with ids (line number if
+        None).
+    :return: generator, generator of (id, text) tuples.
+    """
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            sample_id = record[id_column] if id_column is not None \
+                else line_number
+            yield sample_id, record[column]
+
+
+def iter_directory(path):
+    """
+    Iterate over texts stored in directory (one text file per article).
+
+    :param path: str, path to directory.
+    :return: generator, generator of (file name, text) tuples.
+    """
+    for file_name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, file_name)
+        if not os.path.isfile(file_path):
+            continue
+        with open(file_path, 'r') as f:
+            yield file_name, f.read()
+
+
+def iter_texts(path, column='body', id_column=None):
+    """
+    Iterate over texts from csv file, JSON lines file or directory.
+
+    :param path: str, path to input.
+    :param column: str, name of column with texts (csv, JSON lines).
+    :param id_column: str, name of column with ids (csv, JSON lines).
+    :return: generator, generator of (id, text) tuples.
+    """
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if path.endswith('.jsonl'):
+        return iter_jsonl(path, column, id_column)
+    return iter_csv(path, column, id_column)
+
+
+def iter_chunks(iterable, size):
+    """
+    Split iterable into lists of given size.
+
+    :param iterable: iterable, items to be split.
+    :param size: int, size of one chunk.
+    :return: generator, generator of lists.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def pad_batch(sequences, length_step=64):
+    """
+    Pad batch of sequences to length of the longest one.
+
+    Padded length is rounded up to multiple of `length_step`, so number
+    of different input shapes (and model retracing) is limited.
+
+    :param sequences: list, list of sequences.
+    :param length_step: int, padded length is multiple of this value.
+    :return: numpy.ndarray, padded sequences.
+    """
+    max_len = max(len(sequence) for sequence in sequences)
+    max_len = max(length_step, -(-max_len // length_step) * length_step)
+
+    batch = np.zeros((len(sequences), max_len), dtype='int32')
+    for i, sequence in enumerate(sequences):
+        batch[i, :len(sequence)] = sequence
+
+    return batch
+
+
+def predict_sequences(model, sequences, batch_size=256, length_step=64):
+    """
+    Predict sequences in batches of similar length.
+
+    Sequences are sorted by length, so padding in batches is minimal.
+
+    :param model: keras.Model, pre-trained model.
+    :param sequences: list, list of sequences.
+    :param batch_size: int, number of sequences predicted at once.
+    :param length_step: int, padded length is multiple of this value.
+    :return: numpy.ndarray, predictions in order of input sequences.
+    """
+    order = np.argsort([len(sequence) for sequence in sequences],
+                       kind='stable')
+    predictions = np.zeros(len(sequences), dtype='float32')
+
+    for start in range(0, len(order), batch_size):
+        batch_order = order[start:start + batch_size]
+        batch = pad_batch([sequences[i] for i in batch_order], length_step)
+        predictions[batch_order] = np.asarray(
+            model.predict_on_batch(batch)
+        )[:, 0]
+
+    return predictions
+
+
+def batch_predict(
+        model_name,
+        input_path,
+        output_path,
+        column='body',
+        id_column=None,
+        chunk_size=10000,
+        batch_size=256,
+        compiled=False,
+        jit=False,
+        cache_size=0,
+        cache_path=None,
+        cache_ttl=None,
+        strategy='tail',
+        aggregation='mean',
+        max_windows=4
+):
+    """
+    Predict all texts from input and stream predictions to csv file.
+
+    Input is read and preprocessed in chunks, so memory usage is
+    bounded by chunk size, not by size of input. Duplicate texts are not
+    dropped, so every text gets its prediction regardless of chunk size.
+    With cache, model predicts duplicate texts (after preprocessing) only
+    once.
+
+    :param model_name: str, name of model to be used for prediction.
+    :param input_path: str, path to csv file, JSON lines file or
+        directory with text files.
+    :param output_path: str, path to output csv file.
+    :param column: str, name of column with texts (csv, JSON lines).
+    :param id_column: str, name of column with ids (csv, JSON lines).
+    :param chunk_size: int, number of texts preprocessed at once.
+    :param batch_size: int, number of sequences predicted at once.
+    :param compiled: bool, whether to predict with compiled forward pass
+        (see `CompiledPredictor`).
+    :param jit: bool, whether to compile forward pass with XLA.
+    :param cache_size: int, number of predictions cached in memory (no
+        cache if 0 and `cache_path` is None).
+    :param cache_path: str, path to SQLite database with cached
+        predictions (no disk cache if None).
+    :param cache_ttl: float, time to live of cached predictions in
+        seconds (no expiration if None).
+    :param strategy: str, strategy of predicting texts longer than
+        maximum sequence length of training (see `SequenceWindowing`).
+    :param aggregation: str, aggregation of predictions of windows.
+    :param max_windows: int, maximum number of windows of one text.
+    """
+    model = load_model(model_name)
+    word_index = load_word_index(model_name)
+    windowing = get_windowing(model_name, strategy, aggregation, max_windows)
+
+    if compiled:
+        # Windows have to fit into the longest compiled length, otherwise
+        # they would be truncated from the beginning
+        model = CompiledPredictor(
+            model,
+            lengths=get_bucket_lengths(
+                get_max_seq_len(model_name) if windowing is None
+                else windowing.max_len
+            ),
+            jit=jit,
+            warmup_batch_sizes=(batch_size,)
+        )
+
+    cache = None
+    if cache_size > 0 or cache_path is not None:
+        cache = PredictionCache(
+            get_model_id(
+                model_name,
+                options=None if windowing is None else windowing.get_id(),
+                mode=get_inference_mode(compiled, jit)
+            ),
+            max_size=cache_size,
+            path=cache_path,
+            ttl=cache_ttl
+        )
+
+    num_predicted = 0
+    with open(output_path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(['id', 'prediction'])
+
+        for chunk in iter_chunks(iter_texts(input_path, column, id_column),
+                                 chunk_size):
+            ids = [sample_id for sample_id, _ in chunk]
+            texts = [text if isinstance(text, str) else ''
+                     for _, text in chunk]
+            del chunk
+
+            index, sequences, cleaned_texts = get_sequences(
+                get_texts_dataframe(texts), word_index, return_texts=True,
+                drop_duplicates=False
+            )
+            predictions = [None] * len(texts)
+            if len(sequences):
+                scores = predict_cached(
+                    cache,
+                    cleaned_texts,
+                    sequences,
+                    lambda batch: predict_windowed(
+                        lambda windows: predict_sequences(
+                            model, windows, batch_size
+                        ),
+                        batch,
+                        windowing
+                    )
+                )
+                for i, score in zip(index, scores):
+                    predictions[i] = score
+
+            writer.writerows(
+                (sample_id, '' if prediction is None else float(prediction))
+                for sample_id, prediction in zip(ids, predictions)
+            )
+            output.flush()
+
+            num_predicted += len(texts)
+            print(f'Predicted {num_predicted} texts.')
+
+    if cache is not None:
+        stats = cache.get_stats()
+        print(f'Cache hit rate: {stats["hit_rate"]:.2%} '
+              f'({stats["hits"]} hits, {stats["misses"]} misses).')
+        cache.close()
+
+
+def parse_arguments():
+    """
+    Parse script call arguments.
+
+    :return: argparse.Namespace, arguments namespace object.
+    """
+    parser = ArgumentParser()
+
+    parser.add_argument("-i", "--input", dest="input", required=True,
+                        help="Csv file, JSON lines file or directory with "
+                             "text files of articles.")
+    parser.add_argument("-o", "--output", dest="output", required=True,
+                        help="Output csv file with predictions.")
+    parser.add_argument("-m", "--model", dest="model_name", required=True,
+                        help="Model name (folder, where model is stored).")
+    parser.add_argument("-c", "--column", dest="column", default='body',
+                        help="Column with text of articles.")
+    parser.add_argument("--id-column", dest="id_column", default=None,
+                        help="Column with ids of articles.")
+    parser.add_argument("-cs", "--chunk-size", dest="chunk_size",
+                        default=10000, type=int,
+                        help="Number of articles preprocessed at once.")
+    parser.add_argument("-bs", "--batch-size", dest="batch_size",
+                        default=256, type=int,
+                        help="Number of articles predicted at once.")
+    parser.add_argument("--compiled", dest="compiled", action='store_true',
+                        help="Predict with compiled forward pass of fixed "
+                             "sequence lengths.")
+    parser.add_argument("--jit", dest="jit", action='store_true',
+                        help="Compile forward pass with XLA (requires "
+                             "--compiled).")
+    parser.add_argument("--cache-size", dest="cache_size", default=0,
+                        type=int,
+                        help="Number of predictions cached in memory "
+                             "(duplicate texts are predicted once).")
+    parser.add_argument("--cache-path", dest="cache_path", default=None,
+                        help="SQLite database with cached predictions "
+                             "shared between runs.")
+    parser.add_argument("--cache-ttl", dest="cache_ttl", default=None,
+                        type=float,
+                        help="Time to live of cached predictions in hours.")
+    add_windowing_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.exists(args.input):
+        sys.exit(f'Input {args.input} not found.')
+
+    batch_predict(
+        model_name=args.model_name,
+        input_path=args.input,
+        output_path=args.output,
+        column=args.column,
+        id_column=args.id_column,
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        compiled=args.compiled,
+        jit=args.jit,
+        cache_size=args.cache_size,
+        cache_path=args.cache_path,
+        cache_ttl=None if args.cache_ttl is None else args.cache_ttl * 3600,
+        strategy=args.strategy,
+        aggregation=args.aggregation,
+        max_windows=args.max_windows
+    )
@@ -52,6 +52,20 @@ def parse_input_parameters():
                         help="Number of units in LSTM layer.")
     parser.add_argument("-n", "--name", dest="name",
                         help="Name of training (also folder name).")
+    parser.add_argument("-p", "--preprocess", dest="preprocess",
+                        action='store_true', default=None,
+                        help="Preprocess raw data file before training.")
+    parser.add_argument("-pc", "--preprocessing-cache",
+                        dest="preprocessing_cache_dir",
+                        help="Directory of cached results of preprocessing "
+                             "steps (used with --preprocess).")
+    parser.add_argument("-ls", "--language-sample-size",
+                        dest="language_sample_size", type=int,
+                        help="Number of characters of article used for "
+                             "language detection (used with --preprocess).")
+    parser.add_argument("-lc", "--language-cache", dest="language_cache",
+                        help="SQLite database with cached detected languages "
+                             "(used with --preprocess).")
 
     return parser.parse_args()
 
@@ -66,7 +80,9 @@ def load_custom_configs(config, args):
     """
     args_names = ['batch_size', 'learning_rate', 'num_hidden_layers',
                   'epochs', 'max_words', 'num_samples', 'lstm_units',
-                  'data_file', 'test_size', 'max_seq_len', 'name']
+                  'data_file', 'test_size', 'max_seq_len', 'name',
+                  'preprocess', 'preprocessing_cache_dir',
+                  'language_sample_size', 'language_cache']
 
     for arg in args_names:
         if getattr(args, arg) is not None:
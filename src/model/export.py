@@ -0,0 +1,266 @@
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from os.path import dirname, join
+import numpy as np
+import tensorflow as tf
+from predict import load_model, load_training_config, load_word_index
+from sequences import get_lengths
+from tflite_predictor import TFLitePredictor, get_tflite_path
+from train import prepare_data
+
+QUANTIZATIONS = ('float32', 'float16', 'int8')
+
+
+def get_size(path):
+    """
+    Get size of file or folder (recursively).
+
+    :param path: str, path to file or folder.
+    :return: int, size in bytes.
+    """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    return sum(
+        os.path.getsize(join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def export_tflite(training_name, quantization='float16',
+                  select_tf_ops=False):
+    """
+    Export pre-trained model to TensorFlow Lite.
+
+    By default, model is exported with batch size 1 and any sequence
+    length, so it consists of TensorFlow Lite builtin operations only
+    and runs with `tflite_runtime`. With `select_tf_ops`, batch size is
+    not fixed, but model requires TensorFlow operations (full
+    TensorFlow) to run.
+
+    :param training_name: str, name of training.
+    :param quantization: str, 'float32' (no quantization), 'float16'
+        (float16 weights) or 'int8' (dynamic range int8 weights).
+    :param select_tf_ops: bool, whether to allow TensorFlow operations.
+    :return: str, path to exported model.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f'Unknown quantization: {quantization}.')
+
+    model = load_model(training_name)
+    batch_size = None if select_tf_ops else 1
+    function = tf.function(
+        lambda inputs: model(inputs, training=False),
+        input_signature=[tf.TensorSpec([batch_size, None], tf.int32)]
+    )
+
+    try:
+        converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            [function.get_concrete_function()], model
+        )
+    except TypeError:
+        # Older TensorFlow versions
+        converter = tf.lite.TFLiteConverter.from_concrete_functions(
+            [function.get_concrete_function()]
+        )
+
+    if quantization != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    if select_tf_ops:
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS,
+            tf.lite.OpsSet.SELECT_TF_OPS
+        ]
+
+    path = get_tflite_path(training_name, quantization)
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+    print(f'Model exported to {path} ({get_size(path) / 2 ** 20:.1f} MB).')
+
+    return path
+
+
+def get_test_data(config, samples=None):
+    """
+    Get held-out (test) split of training data.
+
+    Split is loaded from dataset cache (see `prepare_data`), so it is
+    the same as in training. Without cache, it is the same only if
+    training used all samples (`num_samples` not set).
+
+    :param config: dict, training config.
+    :param samples: int, maximum number of test samples.
+    :return: (numpy.ndarray, numpy.ndarray), test sequences and labels.
+    """
+    _, x_test, _, y_test, word_index = prepare_data(
+        data_path=config.get('data_file', None),
+        max_words=config.get('max_words', None),
+        test_size=config.get('test_size', None),
+        max_seq_len=config.get('max_seq_len', None),
+        samples=config.get('num_samples', None),
+        cache=True,
+        n_jobs=int(config.get('tokenizer_jobs', 1)),
+        preprocess=config.get('preprocess', False),
+        preprocessing_cache_dir=config.get('preprocessing_cache_dir', None),
+        language_sample_size=config.get('language_sample_size', None),
+        language_cache=config.get('language_cache', None)
+    )
+
+    if samples is not None:
+        x_test, y_test = x_test[:samples], y_test[:samples]
+
+    if config.get('compact_embeddings', False):
+        # Model was trained on sequences remapped to compact embeddings
+        training_word_index = load_word_index(config['name'])
+        remap = np.zeros(max(word_index.values()) + 1, dtype='int32')
+        for word, index in word_index.items():
+            remap[index] = training_word_index[word]
+        x_test = remap[x_test]
+
+    return np.asarray(x_test), np.asarray(y_test)
+
+
+def evaluate(predict_fn, x, y):
+    """
+    Evaluate accuracy and latency of predictions of single sequences.
+
+    :param predict_fn: callable, function predicting batch of sequences.
+    :param x: numpy.ndarray, post-padded sequences.
+    :param y: numpy.ndarray, labels.
+    :return: (numpy.ndarray, dict), predictions and measured results.
+    """
+    lengths = get_lengths(x)
+    predictions = np.zeros(len(x), dtype='float32')
+    latencies = np.zeros(len(x))
+
+    for i, (sequence, length) in enumerate(zip(x, lengths)):
+        start = time.perf_counter()
+        predictions[i] = np.asarray(
+            predict_fn(sequence[None, :max(1, length)])
+        )[0, 0]
+        latencies[i] = (time.perf_counter() - start) * 1000
+
+    return predictions, {
+        'accuracy': float(np.mean((predictions > 0.5) == y)),
+        'p50': float(np.percentile(latencies, 50)),
+        'p99': float(np.percentile(latencies, 99))
+    }
+
+
+def compare(training_name, quantizations=QUANTIZATIONS, samples=500):
+    """
+    Compare accuracy, latency and size of original model and models
+    exported to TensorFlow Lite on held-out split of training data.
+
+    :param training_name: str, name of training.
+    :param quantizations: tuple, compared quantizations (exported if
+        missing).
+    :param samples: int, maximum number of test samples.
+    :return: list, list of results (dictionaries).
+    """
+    config = load_training_config(training_name)
+    if config is None:
+        raise ValueError(f'Training {training_name} has no stored config.')
+
+    x_test, y_test = get_test_data(config, samples)
+    max_seq_len = config.get('max_seq_len', None)
+    max_seq_len = None if max_seq_len is None else int(max_seq_len)
+
+    start = time.perf_counter()
+    model = load_model(training_name)
+    load_time = time.perf_counter() - start
+
+    reference, result = evaluate(model.predict_on_batch, x_test, y_test)
+    results = [{
+        'model': 'keras',
+        'size': get_size(join(
+            dirname(__file__), f'../../models/{training_name}/model'
+        )),
+        'load_time': load_time,
+        'agreement': 1.0,
+        'max_diff': 0.0,
+        **result
+    }]
+
+    for quantization in quantizations:
+        path = get_tflite_path(training_name, quantization)
+        if not os.path.isfile(path):
+            export_tflite(training_name, quantization)
+
+        start = time.perf_counter()
+        predictor = TFLitePredictor(path, max_seq_len)
+        load_time = time.perf_counter() - start
+
+        predictions, result = evaluate(
+            predictor.predict_on_batch, x_test, y_test
+        )
+        results.append({
+            'model': quantization,
+            'size': get_size(path),
+            'load_time': load_time,
+            'agreement': float(np.mean(
+                (predictions > 0.5) == (reference > 0.5)
+            )),
+            'max_diff': float(np.abs(predictions - reference).max()),
+            **result
+        })
+
+    return results
+
+
+def parse_arguments():
+    """
+    Parse script call arguments.
+
+    :return: argparse.Namespace, arguments namespace object.
+    """
+    parser = ArgumentParser()
+
+    parser.add_argument("-m", "--model", dest="model_name", required=True,
+                        help="Model name (folder, where model is stored).")
+    parser.add_argument("-q", "--quantization", dest="quantization",
+                        default='float16', choices=QUANTIZATIONS,
+                        help="Quantization of exported model.")
+    parser.add_argument("--select-tf-ops", dest="select_tf_ops",
+                        action='store_true',
+                        help="Allow TensorFlow operations (model is not "
+                             "limited to batch size 1, but requires full "
+                             "TensorFlow).")
+    parser.add_argument("-c", "--compare", dest="compare",
+                        action='store_true',
+                        help="Compare original and exported models on "
+                             "held-out data.")
+    parser.add_argument("-s", "--samples", dest="samples", default=500,
+                        type=int,
+                        help="Number of held-out samples used in "
+                             "comparison.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if not os.path.isdir(join(dirname(__file__),
+                              f'../../models/{args.model_name}')):
+        sys.exit(f'Model {args.model_name} not found.')
+
+    if not args.compare:
+        export_tflite(args.model_name, args.quantization, args.select_tf_ops)
+        sys.exit()
+
+    results = compare(args.model_name, samples=args.samples)
+
+    print(f'{"model":>8} {"size [MB]":>10} {"load [s]":>9} '
+          f'{"accuracy":>9} {"agreement":>10} {"max diff":>9} '
+          f'{"p50 [ms]":>9} {"p99 [ms]":>9}')
+    for result in results:
+        print(f'{result["model"]:>8} {result["size"] / 2 ** 20:>10.1f} '
+              f'{result["load_time"]:>9.2f} {result["accuracy"]:>9.4f} '
+              f'{result["agreement"]:>10.4f} {result["max_diff"]:>9.5f} '
+              f'{result["p50"]:>9.2f} {result["p99"]:>9.2f}')
@@ -1,5 +1,6 @@
 import numpy as np
 import os
+from argparse import ArgumentParser
 
 
 def read_fasttext_model(path):
@@ -19,3 +20,273 @@ def read_fasttext_model(path):
             fasttext[values[0]] = np.asarray(values[1:], dtype='float32')
 
     return fasttext
+
+
+def read_fasttext_embeddings(path, word_index, embeddings_dim,
+                             dtype='float32', return_stats=False):
+    """
+    Read embeddings matrix for given vocabulary from .vec file.
+
+    File is streamed line by line and only vectors of words from word
+    index are parsed and written directly into embeddings matrix.
+    Reading stops as soon as all words are found, so memory usage is
+    bounded by vocabulary size, not by size of fastText model.
+
+    :param path: str, path to model in .vec format.
+    :param word_index: dict, dictionary of format 'word: index'.
+    :param embeddings_dim: int, embeddings dimension (len of vectors).
+    :param dtype: str, data type of embeddings matrix.
+    :param return_stats: bool, whether to return also lookup statistics.
+    :return: numpy.array|(numpy.array, dict), embeddings matrix (and
+        statistics with number of `words`, `found` and `not_found` words
+        and `coverage` of vocabulary).
+    """
+    if not os.path.isfile(path):
+        return None
+
+    # Words that does not exist in fastText model,
+    # will have vectors containing only zeros
+    embeddings_matrix = np.zeros((len(word_index), embeddings_dim), dtype)
+
+    # Padding (index 0) is not a word of fastText model
+    words = {word for word, index in word_index.items() if index != 0}
+    remaining = set(words)
+    with open(path) as file:
+        for line in file:
+            word, _, vector = line.rstrip().partition(' ')
+            if word not in remaining:
+                continue
+
+            values = np.asarray(vector.split(' '), dtype='float32')
+            if len(values) != embeddings_dim:
+                continue
+
+            embeddings_matrix[word_index[word]] = values
+            remaining.discard(word)
+            if not remaining:
+                break
+
+    if not return_stats:
+        return embeddings_matrix
+
+    num_found = len(words) - len(remaining)
+    stats = {
+        'words': len(words),
+        'found': num_found,
+        'not_found': len(remaining),
+        'coverage': num_found / len(words) if len(words) else 0.0
+    }
+
+    return embeddings_matrix, stats
+
+
+def get_binary_paths(path):
+    """
+    Get paths of binary embeddings store files for given .vec file.
+
+    :param path: str, path to model in .vec format.
+    :return: (str, str), paths to vectors matrix (.npy) and vocabulary.
+    """
+    base_path = os.path.splitext(path)[0]
+    return f'{base_path}.npy', f'{base_path}.vocab'
+
+
+def get_vocab_index_paths(vocab_path):
+    """
+    Get paths of sorted vocabulary index files for given vocabulary.
+
+    :param vocab_path: str, path to vocabulary file.
+    :return: (str, str), paths to sorted words and their rows (.npy).
+    """
+    return f'{vocab_path}.words.npy', f'{vocab_path}.rows.npy'
+
+
+def build_vocab_index(vocab_path, num_rows=None):
+    """
+    Build sorted vocabulary index and store it next to vocabulary file.
+
+    Words (UTF-8 encoded) are sorted into fixed-width bytes array and
+    row of vectors matrix of each word is stored in array of the same
+    order, so words can be looked up with binary search in memory-mapped
+    arrays without building dictionary.
+
+    :param vocab_path: str, path to vocabulary file.
+    :param num_rows: int, number of rows of vectors matrix (words
+        beyond it are ignored).
+    :return: (str, str), paths to sorted words and their rows (.npy).
+    """
+    with open(vocab_path, 'rb') as vocab:
+        words = vocab.read().split(b'\n')
+    words = np.array(
+        words[:len(words) - 1 if num_rows is None else num_rows], dtype='S'
+    )
+
+    rows = np.argsort(words, kind='stable')
+    words_path, rows_path = get_vocab_index_paths(vocab_path)
+    np.save(words_path, words[rows])
+    np.save(rows_path, rows.astype('int64'))
+
+    return words_path, rows_path
+
+
+def convert_fasttext_model(path):
+    """
+    Convert fastText model from .vec file to binary embeddings store.
+
+    Vectors are written row by row into contiguous float32 matrix stored
+    in .npy file, words are written (one per line, in the same order as
+    vectors) into vocabulary file, together with its sorted index (see
+    `build_vocab_index`). All files are stored next to the .vec file.
+
+    :param path: str, path to model in .vec format.
+    :return: (str, str), paths to vectors matrix (.npy) and vocabulary.
+    """
+    matrix_path, vocab_path = get_binary_paths(path)
+
+    with open(path) as file:
+        header = file.readline().split()
+        if len(header) == 2:
+            num_words, dim = int(header[0]), int(header[1])
+        else:
+            # File without header, count lines and read dimension
+            # from the first line
+            dim = len(header) - 1
+            num_words = 1 + sum(1 for _ in file)
+            file.seek(0)
+
+        matrix = np.lib.format.open_memmap(
+            matrix_path,
+            mode='w+',
+            dtype='float32',
+            shape=(num_words, dim)
+        )
+
+        row = 0
+        with open(vocab_path, 'w') as vocab:
+            for line in file:
+                values = line.rstrip().split(' ')
+                if len(values) != dim + 1:
+                    continue
+                matrix[row] = np.asarray(values[1:], dtype='float32')
+                vocab.write(f'{values[0]}\n')
+                row += 1
+
+    matrix.flush()
+    del matrix
+
+    if row != num_words:
+        # Some lines were malformed, shrink the matrix to valid rows
+        vectors = np.load(matrix_path)[:row]
+        np.save(matrix_path, vectors)
+
+    build_vocab_index(vocab_path, row)
+
+    return matrix_path, vocab_path
+
+
+class FastTextEmbeddings:
+    """
+    Memory-mapped fastText embeddings store.
+
+    Vectors matrix and sorted vocabulary index are memory-mapped
+    (read-only), so loading takes milliseconds and pages are shared
+    between processes using the same store. Words are looked up with
+    binary search in sorted index. Store provides the same `get(word)`
+    lookup as dictionary returned by `read_fasttext_model`. Index is
+    built (once) if store was converted without it.
+
+    :param matrix_path: str, path to vectors matrix (.npy).
+    :param vocab_path: str, path to vocabulary file.
+    """
+
+    def __init__(self, matrix_path, vocab_path):
+        self.vectors = np.load(matrix_path, mmap_mode='r')
+
+        words_path, rows_path = get_vocab_index_paths(vocab_path)
+        if not (os.path.isfile(words_path) and os.path.isfile(rows_path)):
+            build_vocab_index(vocab_path, len(self.vectors))
+        self.words = np.load(words_path, mmap_mode='r')
+        self.rows = np.load(rows_path, mmap_mode='r')
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def get(self, word, default=None):
+        """
+        Get vector of the word.
+
+        :param word: str, word to get vector for.
+        :param default: object, value returned for unknown words.
+        :return: numpy.ndarray, word vector (or default).
+        """
+        row = self.lookup([word])[0]
+        if row < 0:
+            return default
+        return self.vectors[row]
+
+    def lookup(self, words):
+        """
+        Get rows of vectors of many words at once.
+
+        :param words: list, list of words.
+        :return: numpy.ndarray, row of each word in vectors matrix (-1 for
+            unknown words).
+        """
+        rows = np.full(len(words), -1, dtype='int64')
+        if not len(words) or not len(self.words):
+            return rows
+
+        keys = [word.encode('utf-8') for word in words]
+        # Words longer than the longest word of vocabulary would be
+        # truncated in fixed-width array
+        fits = np.fromiter(
+            (len(key) <= self.words.itemsize for key in keys),
+            dtype='bool',
+            count=len(keys)
+        )
+        keys = np.array(keys, dtype=self.words.dtype)
+
+        positions = np.minimum(
+            np.searchsorted(self.words, keys), len(self.words) - 1
+        )
+        found = fits & (self.words[positions] == keys)
+        rows[found] = self.rows[positions[found]]
+
+        return rows
+
+    def __contains__(self, word):
+        return self.lookup([word])[0] >= 0
+
+    def __len__(self):
+        return len(self.words)
+
+
+def load_fasttext_model(path):
+    """
+    Load fastText model, preferably from binary embeddings store.
+
+    If binary store (see `convert_fasttext_model`) exists next to .vec
+    file, it is memory-mapped, otherwise .vec file is parsed.
+
+    :param path: str, path to model in .vec format.
+    :return: FastTextEmbeddings|dict, fastText pre-trained word
+        embeddings.
+    """
+    matrix_path, vocab_path = get_binary_paths(path)
+
+    if os.path.isfile(matrix_path) and os.path.isfile(vocab_path):
+        return FastTextEmbeddings(matrix_path, vocab_path)
+
+    return read_fasttext_model(path)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-f", "--file", dest="file", required=True,
+                        help="Path to fastText model in .vec format.")
+    args = parser.parse_args()
+
+    print('Converting fastText model...')
+    paths = convert_fasttext_model(args.file)
+    print(f'fastText model converted to: {", ".join(paths)}')
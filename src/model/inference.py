@@ -0,0 +1,202 @@
+import numpy as np
+import tensorflow as tf
+from model import FakeNewsDetectionNet
+from sequences import get_lengths, fit_sequences
+
+# Sequence lengths compiled by default (longer inputs are truncated)
+DEFAULT_LENGTHS = (64, 128, 256, 512, 1024, 2048)
+
+
+def get_bucket_lengths(max_seq_len=None, lengths=DEFAULT_LENGTHS):
+    """
+    Get fixed sequence lengths for model trained on sequences of given
+    maximum length.
+
+    The longest fixed length is the maximum length of training, so
+    compiled predictor truncates sequences the same as training.
+
+    :param max_seq_len: int, maximum length of sequences of training
+        (default lengths are used if None).
+    :param lengths: tuple, default fixed sequence lengths.
+    :return: tuple, fixed sequence lengths.
+    """
+    if max_seq_len is None:
+        return tuple(lengths)
+
+    max_seq_len = int(max_seq_len)
+    return tuple(length for length in lengths if length < max_seq_len) + \
+        (max_seq_len,)
+
+
+def get_inference_mode(compiled=False, jit=False):
+    """
+    Get name of mode of prediction (numerical results of modes can
+    slightly differ, so mode is part of prediction cache key).
+
+    :param compiled: bool, whether forward pass is compiled.
+    :param jit: bool, whether forward pass is compiled with XLA.
+    :return: str, 'keras', 'compiled' or 'compiled-xla'.
+    """
+    if not compiled:
+        return 'keras'
+
+    return 'compiled-xla' if jit else 'compiled'
+
+
+def compile_function(func, input_signature, jit=False):
+    """
+    Wrap function in tf.function, optionally compiled with XLA.
+
+    If TensorFlow does not support XLA compilation of tf.function (e.g.
+    TensorFlow 2.0), function is wrapped without it.
+
+    :param func: callable, function to be wrapped.
+    :param input_signature: list, list of tf.TensorSpec of inputs.
+    :param jit: bool, whether to compile function with XLA.
+    :return: tf.types.experimental.GenericFunction, wrapped function.
+    """
+    if not jit:
+        return tf.function(func, input_signature=input_signature)
+
+    try:
+        return tf.function(
+            func, input_signature=input_signature, jit_compile=True
+        )
+    except TypeError:
+        pass
+
+    try:
+        # TensorFlow 2.1 - 2.4
+        return tf.function(
+            func, input_signature=input_signature, experimental_compile=True
+        )
+    except TypeError:
+        print(f'Warning: TensorFlow {tf.__version__} does not support XLA '
+              f'compilation of tf.function, compiling without XLA.')
+        return tf.function(func, input_signature=input_signature)
+
+
+def rebuild_model(model):
+    """
+    Rebuild model loaded from SavedModel as FakeNewsDetectionNet.
+
+    Model loaded from SavedModel only accepts inputs of shapes it was
+    traced with during training, rebuilt model runs original forward
+    pass and accepts any sequence length.
+
+    :param model: keras.Model, model loaded from SavedModel.
+    :return: FakeNewsDetectionNet, model with the same weights.
+    """
+    embeddings = model.embedding_layer.embeddings.numpy()
+    rebuilt = FakeNewsDetectionNet(
+        dim_input=embeddings.shape[0],
+        dim_embeddings=embeddings.shape[1],
+        embeddings=embeddings,
+        lstm_units=model.lstm_layer.weights[1].shape[0],
+        num_hidden_layers=len(model.dense_layers)
+    )
+    rebuilt(tf.zeros((1, 1), dtype=tf.int32))
+    rebuilt.set_weights(model.get_weights())
+
+    return rebuilt
+
+
+class CompiledPredictor:
+    """
+    Predictor running forward pass of model as compiled graph.
+
+    Forward pass is traced once for each of fixed sequence lengths (with
+    any batch size), so new input shapes never trigger retracing.
+    Batch is padded to the shortest fixed length which fits its longest
+    sequence, sequences longer than the longest fixed length are
+    truncated from the beginning (the same as in training, if the
+    longest fixed length is maximum length of training sequences, see
+    `get_bucket_lengths`).
+
+    Predictor can be used in place of keras model for prediction
+    (`predict` and `predict_on_batch` methods).
+
+    :param model: keras.Model, pre-trained model (see `load_model`).
+    :param lengths: tuple, fixed sequence lengths.
+    :param jit: bool, whether to compile forward pass with XLA.
+    :param warmup_batch_sizes: tuple, batch sizes used to run each
+        compiled function once at load time (no warm-up if empty).
+    """
+
+    def __init__(self, model, lengths=DEFAULT_LENGTHS, jit=False,
+                 warmup_batch_sizes=(1,)):
+        self.model = model
+        self.lengths = sorted(lengths)
+        self.jit = jit
+
+        self.functions = {
+            length: compile_function(
+                self.forward,
+                [tf.TensorSpec([None, length], tf.int32)],
+                jit
+            )
+            for length in self.lengths
+        }
+
+        for batch_size in warmup_batch_sizes:
+            self.warmup(batch_size)
+
+    def forward(self, inputs):
+        return self.model(inputs, training=False)
+
+    def warmup(self, batch_size=1):
+        """
+        Run each compiled function once, so the first prediction does
+        not pay for tracing (and XLA compilation).
+
+        :param batch_size: int, batch size of warm-up inputs.
+        """
+        for length, function in self.functions.items():
+            function(tf.zeros((batch_size, length), dtype=tf.int32))
+
+    def get_length(self, max_len):
+        """
+        Get the shortest fixed length which fits sequence.
+
+        :param max_len: int, length of the longest sequence in batch.
+        :return: int, fixed length.
+        """
+        for length in self.lengths:
+            if max_len <= length:
+                return length
+
+        return self.lengths[-1]
+
+    def predict_on_batch(self, x):
+        """
+        Predict batch of sequences.
+
+        :param x: numpy.ndarray, post-padded sequences (2D array).
+        :return: numpy.ndarray, predictions of shape (batch size, 1).
+        """
+        x = np.asarray(x, dtype='int32')
+        if not len(x):
+            return np.zeros((0, 1), dtype='float32')
+
+        lengths = get_lengths(x)
+        length = self.get_length(int(lengths.max()))
+        x = fit_sequences(x, length, lengths)
+
+        return self.functions[length](tf.constant(x)).numpy()
+
+    def predict(self, x, batch_size=32):
+        """
+        Predict sequences in batches.
+
+        :param x: numpy.ndarray, post-padded sequences (2D array).
+        :param batch_size: int, number of sequences predicted at once.
+        :return: numpy.ndarray, predictions of shape (samples, 1).
+        """
+        x = np.asarray(x, dtype='int32')
+        if not len(x):
+            return np.zeros((0, 1), dtype='float32')
+
+        return np.concatenate([
+            self.predict_on_batch(x[start:start + batch_size])
+            for start in range(0, len(x), batch_size)
+        ])
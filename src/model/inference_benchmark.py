@@ -0,0 +1,130 @@
+import time
+from argparse import ArgumentParser
+import numpy as np
+from predict import load_model, load_word_index, get_max_seq_len
+from inference import CompiledPredictor, get_bucket_lengths
+
+
+def measure_latency(predict_fn, batch, repeats=50, warmup=3):
+    """
+    Measure latency of prediction of one batch.
+
+    :param predict_fn: callable, function predicting batch.
+    :param batch: numpy.ndarray, batch of sequences.
+    :param repeats: int, number of measured predictions.
+    :param warmup: int, number of predictions before measurement.
+    :return: numpy.ndarray, latencies in milliseconds.
+    """
+    for _ in range(warmup):
+        predict_fn(batch)
+
+    latencies = np.zeros(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        predict_fn(batch)
+        latencies[i] = (time.perf_counter() - start) * 1000
+
+    return latencies
+
+
+def get_random_batch(batch_size, seq_len, vocab_size, seed=0):
+    """
+    Get batch of random post-padded sequences of similar length.
+
+    :param batch_size: int, number of sequences.
+    :param seq_len: int, maximum length of sequences.
+    :param vocab_size: int, size of vocabulary.
+    :param seed: int, seed of random generator.
+    :return: numpy.ndarray, batch of sequences.
+    """
+    generator = np.random.RandomState(seed)
+    batch = generator.randint(1, vocab_size, (batch_size, seq_len))
+    lengths = generator.randint(seq_len // 2, seq_len + 1, batch_size)
+    batch[np.arange(seq_len)[None, :] >= lengths[:, None]] = 0
+
+    return batch.astype('int32')
+
+
+def benchmark(model_name, batch_sizes=(1, 8, 32), seq_len=512, repeats=50,
+              jit=False):
+    """
+    Compare latency of keras prediction and compiled prediction.
+
+    :param model_name: str, name of model to be benchmarked.
+    :param batch_sizes: tuple, benchmarked batch sizes.
+    :param seq_len: int, maximum length of sequences.
+    :param repeats: int, number of measured predictions.
+    :param jit: bool, whether to compile forward pass with XLA.
+    :return: list, list of results (dictionaries).
+    """
+    model = load_model(model_name)
+    vocab_size = len(load_word_index(model_name)) + 1
+
+    start = time.perf_counter()
+    predictor = CompiledPredictor(
+        model,
+        lengths=get_bucket_lengths(get_max_seq_len(model_name)),
+        jit=jit,
+        warmup_batch_sizes=batch_sizes
+    )
+    print(f'Compiled predictor loaded in '
+          f'{time.perf_counter() - start:.2f} s')
+
+    modes = [
+        ('keras', model.predict_on_batch),
+        ('compiled', predictor.predict_on_batch)
+    ]
+
+    results = []
+    for batch_size in batch_sizes:
+        batch = get_random_batch(batch_size, seq_len, vocab_size)
+        for mode, predict_fn in modes:
+            latencies = measure_latency(predict_fn, batch, repeats)
+            results.append({
+                'mode': mode,
+                'batch_size': batch_size,
+                'p50': float(np.percentile(latencies, 50)),
+                'p99': float(np.percentile(latencies, 99))
+            })
+
+    return results
+
+
+def parse_arguments():
+    """
+    Parse script call arguments.
+
+    :return: argparse.Namespace, arguments namespace object.
+    """
+    parser = ArgumentParser()
+
+    parser.add_argument("-m", "--model", dest="model_name", required=True,
+                        help="Model name (folder, where model is stored).")
+    parser.add_argument("-bs", "--batch-sizes", dest="batch_sizes",
+                        default=[1, 8, 32], type=int, nargs='+',
+                        help="Benchmarked batch sizes.")
+    parser.add_argument("-sl", "--max-sequence-len", dest="seq_len",
+                        default=512, type=int,
+                        help="Maximum length of benchmarked sequences.")
+    parser.add_argument("-r", "--repeats", dest="repeats", default=50,
+                        type=int, help="Number of measured predictions.")
+    parser.add_argument("--jit", dest="jit", action='store_true',
+                        help="Compile forward pass with XLA.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    results = benchmark(
+        model_name=args.model_name,
+        batch_sizes=args.batch_sizes,
+        seq_len=args.seq_len,
+        repeats=args.repeats,
+        jit=args.jit
+    )
+
+    print(f'{"mode":>10} {"batch":>6} {"p50 [ms]":>10} {"p99 [ms]":>10}')
+    for result in results:
+        print(f'{result["mode"]:>10} {result["batch_size"]:>6} '
+              f'{result["p50"]:>10.2f} {result["p99"]:>10.2f}')
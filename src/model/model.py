@@ -1,3 +1,4 @@
+import tensorflow as tf
 import tensorflow.keras as keras
 
 
@@ -46,8 +47,8 @@ class FakeNewsDetectionNet(keras.Model):
         )
 
     def call(self, input):
+        mask = tf.not_equal(input, 0)
         x = self.embedding_layer(input)
-        mask = self.embedding_layer.compute_mask(input)
         x = self.lstm_layer(x, mask=mask)
         for layer in self.dense_layers:
             x = layer(x)
@@ -1,16 +1,20 @@
 from argparse import ArgumentParser
+import json
 import pandas as pd
 import sys
-from os.path import dirname, join, abspath
+from os.path import dirname, join, abspath, isfile
 from tensorflow import keras
 import pickle
 from tensorflow.keras.preprocessing.sequence import pad_sequences
 
 sys.path.append(abspath(join(dirname(__file__), '../../')))
 from src.data.preprocessing import preprocess_data
+from config import load_config
+from inference import rebuild_model
+from sequences import SequenceWindowing, STRATEGIES, AGGREGATIONS
+from prediction_cache import PredictionCache, get_model_id, predict_cached
 
 
-# TODO has sequence length be the same as when training?
 # TODO fix storing and loading model
 # TODO more beautiful print-out of prediction
 
@@ -21,7 +25,7 @@ def load_model(training_name):
     :param training_name: str, name of training (also name of model
         stored in models folder.
     :return keras.Model, pre-trained keras model (our fake news
-        detection net model).
+        detection net model, rebuilt so it accepts any sequence length).
     """
     if training_name is None:
         return None
@@ -31,7 +35,7 @@ def load_model(training_name):
         f'../../models/{training_name}/model'
     )
 
-    return keras.models.load_model(path_to_model)
+    return rebuild_model(keras.models.load_model(path_to_model))
 
 
 def parse_arguments():
@@ -46,9 +50,32 @@ def parse_arguments():
                         help="File with text of article.")
     parser.add_argument("-m", "--model", dest="model_name", required=True,
                         help="Model name (folder, where model is stored ).")
+    parser.add_argument("--cache-path", dest="cache_path", default=None,
+                        help="SQLite database with cached predictions.")
+    add_windowing_arguments(parser)
     return parser.parse_args()
 
 
+def add_windowing_arguments(parser):
+    """
+    Add arguments of windowing of long documents to parser.
+
+    :param parser: argparse.ArgumentParser, parser of script arguments.
+    """
+    parser.add_argument("--strategy", dest="strategy", default='tail',
+                        choices=STRATEGIES,
+                        help="Strategy of predicting documents longer than "
+                             "maximum sequence length of training.")
+    parser.add_argument("--aggregation", dest="aggregation", default='mean',
+                        choices=AGGREGATIONS,
+                        help="Aggregation of predictions of windows "
+                             "(strategy 'windows').")
+    parser.add_argument("--max-windows", dest="max_windows", default=4,
+                        type=int,
+                        help="Maximum number of windows of one document "
+                             "(strategy 'windows').")
+
+
 def get_text_dataframe(file):
     """
     From given text, return dataframe with one row only.
@@ -63,45 +90,244 @@ def get_text_dataframe(file):
     )
 
 
-def preprocess_input(dataframe, training_name):
+def get_texts_dataframe(texts):
     """
-    Preprocess input dataframe to sequences.
+    From given texts, return dataframe with one row per text.
 
-    :param dataframe: pd.DataFrame, dataframe to be preprocessed.
-    :param training_name: str, training name used for reading correct
-        word_index table.
-    :return list, list of sequences for embedding layer.
+    :param texts: list, list of texts (strings).
+    :return pd.DataFrame, dataframe from given texts.
     """
-    data = preprocess_data([dataframe])[0]
+    return pd.DataFrame(
+        data={'body': list(texts), 'label': ['not_predicted_yet'] * len(texts)}
+    )
+
+
+def load_word_index(training_name):
+    """
+    Load word index table from specific training.
 
-    word_index = pickle.load(
-        open(
+    :param training_name: str, name of training (also name of folder
+        where word index table is stored).
+    :return dict, word index table.
+    """
+    with open(
             join(
                 dirname(__file__),
                 f'../../models/{training_name}/word_index.obj'
             ),
             'rb'
-        )
+    ) as f:
+        return pickle.load(f)
+
+
+def load_training_config(training_name):
+    """
+    Load config of specific training.
+
+    :param training_name: str, name of training (also name of folder
+        where config is stored).
+    :return dict, training config (None if training has no stored
+        config).
+    """
+    path = join(dirname(__file__), f'../../models/{training_name}/config.json')
+    if not isfile(path):
+        return None
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def get_max_seq_len(training_name):
+    """
+    Get maximum length of sequences used in specific training.
+
+    Trainings without stored config used default config.
+
+    :param training_name: str, name of training.
+    :return int, maximum length of sequences (None if not limited).
+    """
+    config = load_training_config(training_name) or load_config() or {}
+    max_seq_len = config.get('max_seq_len', None)
+
+    return None if max_seq_len is None else int(max_seq_len)
+
+
+def get_windowing(training_name, strategy='tail', aggregation='mean',
+                  max_windows=4):
+    """
+    Get windowing of long documents limited by maximum length of
+    sequences used in specific training.
+
+    :param training_name: str, name of training.
+    :param strategy: str, strategy of windowing (see `SequenceWindowing`).
+    :param aggregation: str, aggregation of predictions of windows.
+    :param max_windows: int, maximum number of windows of one document.
+    :return SequenceWindowing, windowing (None if length of sequences
+        is not limited).
+    """
+    max_seq_len = get_max_seq_len(training_name)
+    if max_seq_len is None:
+        return None
+
+    return SequenceWindowing(max_seq_len, strategy, aggregation, max_windows)
+
+
+def predict_windowed(predict_fn, sequences, windowing=None):
+    """
+    Predict sequences, long sequences by their windows.
+
+    :param predict_fn: callable, function predicting list of sequences
+        and returning array of predictions.
+    :param sequences: list, list of sequences.
+    :param windowing: SequenceWindowing, windowing of long sequences
+        (sequences are predicted whole if None).
+    :return numpy.ndarray, prediction of each sequence.
+    """
+    if windowing is None:
+        return predict_fn(sequences)
+
+    return windowing.predict(predict_fn, sequences)
+
+
+def get_sequences(dataframe, word_index, return_texts=False,
+                  drop_duplicates=False):
+    """
+    Preprocess input dataframe and convert texts to sequences.
+
+    Samples filtered out by preprocessing are not included in result.
+    Duplicate texts are preserved by default, so prediction of text never
+    depends on other texts predicted with it.
+
+    :param dataframe: pd.DataFrame, dataframe to be preprocessed.
+    :param word_index: dict, word index table.
+    :param return_texts: bool, whether to return also preprocessed texts.
+    :param drop_duplicates: bool, whether to remove duplicate texts.
+    :return (pd.Index, list)|(pd.Index, list, list), index of preserved
+        samples and their sequences (and preprocessed texts).
+    """
+    data = preprocess_data([dataframe], drop_duplicates=drop_duplicates)[0]
+
+    sequences = [
+        [word_index.get(word, 0) for word in body.split()]
+        for body in data.body
+    ]
+
+    if return_texts:
+        return data.index, sequences, data.body.tolist()
+
+    return data.index, sequences
+
+
+def preprocess_input(dataframe, training_name, word_index=None,
+                     max_seq_len=None):
+    """
+    Preprocess input dataframe to sequences.
+
+    Too long sequences are truncated from the beginning, the same as in
+    training.
+
+    :param dataframe: pd.DataFrame, dataframe to be preprocessed.
+    :param training_name: str, training name used for reading correct
+        word_index table.
+    :param word_index: dict, already loaded word index table (if None,
+        it is loaded from training folder).
+    :param max_seq_len: int, maximum length of sequences (if None,
+        maximum length of sequences of training is used).
+    :return list, list of sequences for embedding layer.
+    """
+    if word_index is None:
+        word_index = load_word_index(training_name)
+    if max_seq_len is None:
+        max_seq_len = get_max_seq_len(training_name)
+
+    _, sequences = get_sequences(dataframe, word_index)
+
+    return pad_sequences(sequences, padding='post', maxlen=max_seq_len)
+
+
+def predict_texts(model, word_index, texts, cache=None, windowing=None):
+    """
+    Predict texts using already loaded model and word index table.
+
+    :param model: keras.Model, pre-trained model.
+    :param word_index: dict, word index table.
+    :param texts: list, list of texts (strings) to be predicted.
+    :param cache: PredictionCache, cache of predictions of preprocessed
+        texts (no cache if None).
+    :param windowing: SequenceWindowing, windowing of long texts (texts
+        are predicted whole if None).
+    :return list, prediction for each text (None for texts filtered out
+        by preprocessing).
+    """
+    index, sequences, cleaned_texts = get_sequences(
+        get_texts_dataframe(texts), word_index, return_texts=True
     )
-    sequence = [word_index.get(word, 0) for word in data.loc[0].body.split()]
 
-    return pad_sequences([sequence], padding='post')
+    predictions = [None] * len(texts)
+    if len(sequences):
+        scores = predict_cached(
+            cache,
+            cleaned_texts,
+            sequences,
+            lambda batch: predict_windowed(
+                lambda windows: model.predict(
+                    pad_sequences(windows, padding='post')
+                )[:, 0],
+                batch,
+                windowing
+            )
+        )
+        for i, score in zip(index, scores):
+            predictions[i] = score
+
+    return predictions
 
 
-def predict(model_name=None, file=None):
+def predict(model_name=None, file=None, cache_path=None, strategy='tail',
+            aggregation='mean', max_windows=4):
     """
     Predict text whether it is fake or real using pre-trained model.
 
     :param model_name: str, name of model to be used for prediction.
     :param file: str, path to file with news text.
+    :param cache_path: str, path to SQLite database with cached
+        predictions (no cache if None).
+    :param strategy: str, strategy of predicting long text (see
+        `SequenceWindowing`).
+    :param aggregation: str, aggregation of predictions of windows.
+    :param max_windows: int, maximum number of windows of text.
     """
-    model = load_model(model_name)
+    windowing = get_windowing(model_name, strategy, aggregation, max_windows)
+
+    cache = None
+    if cache_path is not None:
+        cache = PredictionCache(
+            get_model_id(
+                model_name,
+                options=None if windowing is None else windowing.get_id()
+            ),
+            path=cache_path
+        )
 
     dataframe = get_text_dataframe(file)
+    _, sequences, texts = get_sequences(
+        dataframe, load_word_index(model_name), return_texts=True
+    )
 
-    to_predict = preprocess_input(dataframe, model_name)
+    def predict_batch(batch):
+        # Model is loaded only if prediction is not cached
+        model = load_model(model_name)
+        return predict_windowed(
+            lambda windows: model.predict(
+                pad_sequences(windows, padding='post')
+            )[:, 0],
+            batch,
+            windowing
+        )
 
-    prediction = model.predict(to_predict)
+    prediction = predict_cached(cache, texts, sequences, predict_batch)
+    if cache is not None:
+        cache.close()
 
     print(f'Model prediction: {prediction}')
 
@@ -120,5 +346,9 @@ if __name__ == "__main__":
 
     predict(
         model_name=args.model_name,
-        file=args.file
+        file=args.file,
+        cache_path=args.cache_path,
+        strategy=args.strategy,
+        aggregation=args.aggregation,
+        max_windows=args.max_windows
     )
@@ -0,0 +1,284 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from os.path import dirname, isfile, join
+
+
+def get_model_id(training_name, tflite=None, options=None, mode='keras'):
+    """
+    Get identifier of model, which changes whenever model is replaced.
+
+    Identifier is computed from training name and sizes and modification
+    times of model files and word index table, so predictions cached
+    for different training run (or retrained model) are never used.
+
+    :param training_name: str, name of training.
+    :param tflite: str, quantization of model exported to TensorFlow
+        Lite (None for keras model).
+    :param options: str, identifier of prediction options which change
+        predictions (e.g. windowing of long documents).
+    :param mode: str, mode of prediction of keras model (see
+        `inference.get_inference_mode`).
+    :return: str, model identifier.
+    """
+    folder = join(dirname(__file__), f'../../models/{training_name}')
+
+    paths = [join(folder, 'word_index.obj')]
+    if tflite is not None:
+        paths.append(join(folder, f'model-{tflite}.tflite'))
+    else:
+        for root, _, names in sorted(os.walk(join(folder, 'model'))):
+            paths.extend(join(root, name) for name in sorted(names))
+
+    model_hash = hashlib.sha1(
+        f'{training_name}:{tflite}:{options}:'
+        f'{mode if tflite is None else None}'.encode('utf-8')
+    )
+    for path in paths:
+        if isfile(path):
+            stat = os.stat(path)
+            model_hash.update(
+                f'{os.path.relpath(path, folder)}:{stat.st_size}:'
+                f'{stat.st_mtime_ns}'.encode('utf-8')
+            )
+
+    return model_hash.hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of predictions keyed by hash of cleaned text and
+    model identifier.
+
+    The first tier is in-process LRU dictionary, the second (optional)
+    tier is SQLite database shared between runs, processes and models.
+    Entries older than `ttl` are not used (and removed from memory),
+    least recently used entries are evicted above size limits. Database
+    is shared, so expired entries are never deleted from it by TTL (other
+    caches can use different TTL), only by size limit.
+
+    :param model_id: str, identifier of model (see `get_model_id`).
+    :param max_size: int, maximum number of entries in memory.
+    :param path: str, path to SQLite database (no disk tier if None).
+    :param max_disk_size: int, maximum number of entries on disk.
+    :param ttl: float, time to live of entries in seconds (no expiration
+        if None).
+    """
+
+    def __init__(self, model_id, max_size=10000, path=None,
+                 max_disk_size=1000000, ttl=None):
+        self.model_id = model_id
+        self.max_size = max_size
+        self.max_disk_size = max_disk_size
+        self.ttl = ttl
+
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'memory_hits': 0, 'disk_hits': 0,
+                      'misses': 0}
+
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS predictions '
+                '(key TEXT PRIMARY KEY, prediction REAL, created_at REAL, '
+                'accessed_at REAL)'
+            )
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS predictions_accessed_at '
+                'ON predictions (accessed_at)'
+            )
+            self.connection.commit()
+            self.disk_size = self.count_disk()
+
+    def get_key(self, text):
+        """
+        Get cache key of cleaned text.
+
+        :param text: str, cleaned (preprocessed) text.
+        :return: str, cache key.
+        """
+        return hashlib.sha1(
+            f'{self.model_id}\0{text}'.encode('utf-8')
+        ).hexdigest()
+
+    def is_expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get_many(self, keys):
+        """
+        Get cached predictions.
+
+        :param keys: list, list of cache keys.
+        :return: dict, dictionary of format 'key: prediction' (only for
+            cached keys).
+        """
+        now = time.time()
+        found = {}
+
+        with self.lock:
+            missing = []
+            for key in keys:
+                entry = self.memory.get(key)
+                if entry is not None and not self.is_expired(entry[1], now):
+                    self.memory.move_to_end(key)
+                    found[key] = entry[0]
+                    self.stats['memory_hits'] += 1
+                    continue
+
+                if entry is not None:
+                    del self.memory[key]
+                missing.append(key)
+
+            if self.connection is not None and missing:
+                for key, prediction, created_at in self.get_disk(missing):
+                    if self.is_expired(created_at, now):
+                        continue
+                    found[key] = prediction
+                    self.set_memory(key, prediction, created_at)
+                    self.stats['disk_hits'] += 1
+
+                self.connection.executemany(
+                    'UPDATE predictions SET accessed_at = ? WHERE key = ?',
+                    ((now, key) for key in missing if key in found)
+                )
+                self.connection.commit()
+
+            num_hits = sum(1 for key in keys if key in found)
+            self.stats['hits'] += num_hits
+            self.stats['misses'] += len(keys) - num_hits
+
+        return found
+
+    def get_disk(self, keys, chunk_size=500):
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            yield from self.connection.execute(
+                f'SELECT key, prediction, created_at FROM predictions '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                chunk
+            )
+
+    def set_memory(self, key, prediction, created_at):
+        self.memory[key] = (prediction, created_at)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def evict_memory(self, now):
+        # Least recently used entries are removed while they are expired
+        while self.memory:
+            key, (_, created_at) = next(iter(self.memory.items()))
+            if not self.is_expired(created_at, now):
+                break
+            del self.memory[key]
+
+    def set_many(self, predictions):
+        """
+        Cache predictions.
+
+        :param predictions: dict, dictionary of format 'key: prediction'.
+        """
+        now = time.time()
+
+        with self.lock:
+            self.evict_memory(now)
+            for key, prediction in predictions.items():
+                self.set_memory(key, prediction, now)
+
+            if self.connection is None:
+                return
+
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO predictions '
+                '(key, prediction, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)',
+                ((key, prediction, now, now)
+                 for key, prediction in predictions.items())
+            )
+            # Replaced entries are counted too, so size is only upper
+            # bound and table is counted once it exceeds the limit
+            self.disk_size += len(predictions)
+            if self.disk_size > self.max_disk_size:
+                self.evict_disk()
+            self.connection.commit()
+
+    def count_disk(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM predictions'
+        ).fetchone()[0]
+
+    def evict_disk(self):
+        self.disk_size = self.count_disk()
+        if self.disk_size <= self.max_disk_size:
+            return
+
+        self.connection.execute(
+            'DELETE FROM predictions WHERE key IN (SELECT key FROM '
+            'predictions ORDER BY accessed_at LIMIT ?)',
+            (self.disk_size - self.max_disk_size,)
+        )
+        self.disk_size = self.max_disk_size
+
+    def get_stats(self):
+        """
+        Get cache metrics.
+
+        :return: dict, numbers of hits (in memory and on disk) and misses,
+            hit rate and number of entries in memory.
+        """
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_size'] = len(self.memory)
+
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+
+        return stats
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def predict_cached(cache, texts, sequences, predict_fn):
+    """
+    Predict sequences, using cached predictions of their texts.
+
+    Only sequences of texts which are not cached are predicted (each
+    distinct text once) and their predictions are cached.
+
+    :param cache: PredictionCache, cache of predictions (all sequences
+        are predicted if None).
+    :param texts: list, list of cleaned texts.
+    :param sequences: list, list of sequences of texts.
+    :param predict_fn: callable, function predicting list of sequences
+        and returning array of predictions.
+    :return: list, list of predictions.
+    """
+    if not len(sequences):
+        return []
+    if cache is None:
+        return [float(score) for score in predict_fn(sequences)]
+
+    keys = [cache.get_key(text) for text in texts]
+    predictions = cache.get_many(keys)
+
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in predictions:
+            missing.setdefault(key, i)
+
+    if missing:
+        scores = predict_fn([sequences[i] for i in missing.values()])
+        new_predictions = {
+            key: float(score) for key, score in zip(missing, scores)
+        }
+        cache.set_many(new_predictions)
+        predictions.update(new_predictions)
+
+    return [predictions[key] for key in keys]
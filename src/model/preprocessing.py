@@ -1,9 +1,26 @@
+import hashlib
+import pickle
+import shutil
 import numpy as np
 import pandas as pd
-from os.path import dirname, join
-from tensorflow.keras.preprocessing.text import Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+from os import makedirs, rename
+from os.path import dirname, join, isfile
+import tensorflow as tf
 from sklearn.model_selection import train_test_split
+from tokenizer import ParallelTokenizer
+
+
+def get_data_path(path=None):
+    """
+    Get path to data csv file.
+
+    :param path: str, path to data csv file (default path if None).
+    :return: str, path to data csv file.
+    """
+    if path is None:
+        path = join(dirname(__file__), '../../data/preprocessed/dataset.csv')
+
+    return path
 
 
 def read_data(path=None, samples=None):
@@ -14,10 +31,7 @@ def read_data(path=None, samples=None):
     :param samples: int, number of samples to choose, None for all.
     :return: pd.DataFrame, dataframe with data.
     """
-    if path is None:
-        path = join(dirname(__file__), '../../data/preprocessed/dataset.csv')
-
-    df = pd.read_csv(path, index_col=0)
+    df = pd.read_csv(get_data_path(path), index_col=0)
 
     # Categorical encoding of labels
     df['label'] = df['label'].apply(
@@ -43,7 +57,8 @@ def split_data(x, y, test_size=0.15):
     return train_test_split(x, y, test_size=test_size, random_state=1)
 
 
-def get_sequences_and_word_index(texts, max_words=None, max_seq_len=None):
+def get_sequences_and_word_index(texts, max_words=None, max_seq_len=None,
+                                 n_jobs=1):
     """
     Get sequences and word index table from texts.
 
@@ -51,6 +66,8 @@ def get_sequences_and_word_index(texts, max_words=None, max_seq_len=None):
     :param max_words: int, maximum number of words to preserve (top
         words).
     :param max_seq_len: int, maximum length of all sequences.
+    :param n_jobs: int, number of processes used by tokenizer (all CPUs
+        if -1).
     :return: (numpy.ndarray, dict), generated sequences and word index.
     """
     if max_words is not None:
@@ -59,22 +76,19 @@ def get_sequences_and_word_index(texts, max_words=None, max_seq_len=None):
     if max_seq_len is not None:
         max_seq_len = int(max_seq_len)
 
-    tokenizer = Tokenizer(num_words=max_words)
+    tokenizer = ParallelTokenizer(num_words=max_words, n_jobs=n_jobs)
     tokenizer.fit_on_texts(texts)
-    
-    # Create sequences from texts
-    sequences = tokenizer.texts_to_sequences(texts)
 
-    # Pad sequences
-    sequences = pad_sequences(sequences, padding='post', maxlen=max_seq_len)
+    # Create padded sequences from texts
+    sequences = tokenizer.texts_to_padded_sequences(texts, maxlen=max_seq_len)
 
     word_index = tokenizer.word_index
     print(f'Count of unique tokens: {len(word_index)}')
 
     word_index['<pad>'] = 0
     if max_words is not None:
-        # This step is done due to issue on keras Tokenizer:
-        # https://github.com/keras-team/keras/issues/8092
+        # Only top words are used in sequences (the same as in keras
+        # Tokenizer: https://github.com/keras-team/keras/issues/8092)
         word_index = {
             word: idx for word, idx
             in tokenizer.word_index.items()
@@ -84,27 +98,261 @@ def get_sequences_and_word_index(texts, max_words=None, max_seq_len=None):
     return sequences, word_index
 
 
-def get_embeddings_matrix(word_index, pretrained_embeddings, embeddings_dim):
+def get_bucketed_dataset(
+        sequences,
+        labels,
+        batch_size,
+        bucket_boundaries=(64, 128, 256, 512, 1024, 2048),
+        shuffle=True
+):
+    """
+    Get tf.data dataset of sequences batched by their length.
+
+    Padding is removed from (post-padded) sequences and sequences are
+    grouped into buckets by length. Each batch is padded only to the
+    upper boundary of its bucket (instead of maximum sequence length),
+    so the number of different batch shapes stays small.
+
+    :param sequences: numpy.ndarray, post-padded sequences.
+    :param labels: numpy.ndarray, labels of sequences.
+    :param batch_size: int, batch size.
+    :param bucket_boundaries: list, upper boundaries of sequence length
+        buckets (boundaries above maximum sequence length are ignored).
+    :param shuffle: bool, whether to shuffle samples in every epoch.
+    :return: tf.data.Dataset, dataset of (sequences, labels) batches.
+    """
+    max_seq_len = sequences.shape[1]
+    lengths = np.maximum(np.count_nonzero(sequences, axis=1), 1)
+    labels = np.asarray(labels, dtype='float32')
+
+    # Last bucket contains sequences of maximum length
+    boundaries = sorted(int(b) for b in bucket_boundaries
+                        if int(b) <= max_seq_len)
+    boundaries.append(max_seq_len + 1)
+
+    def get_sample(index):
+        return sequences[index, :lengths[index]].astype('int32'), \
+               labels[index]
+
+    def load_sample(index):
+        sequence, label = tf.numpy_function(
+            get_sample, [index], (tf.int32, tf.float32)
+        )
+        sequence.set_shape([None])
+        label.set_shape([])
+        return sequence, label
+
+    dataset = tf.data.Dataset.range(len(labels))
+    if shuffle:
+        dataset = dataset.shuffle(len(labels), reshuffle_each_iteration=True)
+
+    dataset = dataset.map(
+        load_sample,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE
+    )
+    dataset = dataset.apply(tf.data.experimental.bucket_by_sequence_length(
+        element_length_func=lambda sequence, label: tf.shape(sequence)[0],
+        bucket_boundaries=boundaries,
+        bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
+        padded_shapes=([None], []),
+        pad_to_bucket_boundary=True
+    ))
+
+    return dataset.prefetch(tf.data.experimental.AUTOTUNE)
+
+
+def get_embeddings_matrix(word_index, pretrained_embeddings, embeddings_dim,
+                          dtype='float32', return_stats=False):
     """
     Function to get embeddings matrix from word index and pre-trained
     embeddings (e.g. fastText).
 
+    All words are looked up at once and found vectors are copied into
+    matrix with single fancy-indexed assignment. Binary fastText store
+    (`FastTextEmbeddings`) resolves words to rows of its vectors matrix
+    in bulk, dictionary of vectors is looked up word by word.
+
     :param word_index: dict, dictionary of format 'word: index'.
-    :param pretrained_embeddings: np.array, pre-trained embeddings.
+    :param pretrained_embeddings: FastTextEmbeddings|dict, pre-trained
+        embeddings.
     :param embeddings_dim: int, embeddings dimension (len of vectors).
-    :return: numpy.array, embeddings matrix.
+    :param dtype: str, data type of embeddings matrix.
+    :param return_stats: bool, whether to return also lookup statistics.
+    :return: numpy.array|(numpy.array, dict), embeddings matrix (and
+        statistics with number of `words`, `found` and `not_found` words
+        and `coverage` of vocabulary).
     """
-    # Words that does not exist in word index table,
+    words = list(word_index)
+    indexes = np.fromiter(word_index.values(), dtype='int64', count=len(words))
+
+    # Words that does not exist in pre-trained embeddings,
     # will have vectors containing only zeros
-    embeddings_matrix = np.zeros((len(word_index), embeddings_dim))
-
-    not_found = 0
-    for word, i in word_index.items():
-        vector = pretrained_embeddings.get(word)
-        if vector is not None:
-            embeddings_matrix[i] = vector
-        else:
-            not_found += 1
-
-    print(f'Number of words not found in pre-trained embeddings: {not_found}')
-    return embeddings_matrix
+    embeddings_matrix = np.zeros((len(word_index), embeddings_dim), dtype)
+
+    if hasattr(pretrained_embeddings, 'lookup'):
+        rows = pretrained_embeddings.lookup(words)
+        found = rows >= 0
+
+        # Rows are read in order of matrix, so memory-mapped store is
+        # read sequentially
+        order = np.argsort(rows[found], kind='stable')
+        embeddings_matrix[indexes[found][order]] = \
+            pretrained_embeddings.vectors[rows[found][order]]
+    else:
+        vectors = [pretrained_embeddings.get(word) for word in words]
+        # Vectors of other dimension (e.g. header line of .vec file read
+        # as vector) are skipped
+        found = np.fromiter(
+            (vector is not None and len(vector) == embeddings_dim
+             for vector in vectors),
+            dtype='bool',
+            count=len(words)
+        )
+        if found.any():
+            embeddings_matrix[indexes[found]] = np.stack([
+                vector for vector, is_found in zip(vectors, found)
+                if is_found
+            ])
+
+    if not return_stats:
+        return embeddings_matrix
+
+    # Padding (index 0) is not a word of pre-trained embeddings
+    is_word = indexes != 0
+    num_words = int(is_word.sum())
+    num_found = int(found[is_word].sum())
+    stats = {
+        'words': num_words,
+        'found': num_found,
+        'not_found': num_words - num_found,
+        'coverage': num_found / num_words if num_words else 0.0
+    }
+
+    return embeddings_matrix, stats
+
+
+def compact_embeddings(embeddings_matrix, word_index, dtype='float32'):
+    """
+    Remove duplicate all-zero rows (words not found in pre-trained
+    embeddings) from embeddings matrix.
+
+    Row 0 stays padding, all words without pre-trained vector share
+    one all-zero OOV row 1 and found words follow in order of their
+    original index. Model sees exactly the same vectors as with full
+    matrix, only sequences have to be remapped to new indexes.
+
+    :param embeddings_matrix: numpy.ndarray, full embeddings matrix.
+    :param word_index: dict, dictionary of format 'word: index'.
+    :param dtype: str, data type of compact matrix.
+    :return: (numpy.ndarray, dict, numpy.ndarray), compact embeddings
+        matrix, word index with new indexes and array mapping original
+        indexes to new ones.
+    """
+    found = np.any(embeddings_matrix != 0, axis=1)
+    found[0] = False
+
+    remap = np.ones(len(embeddings_matrix), dtype='int32')
+    remap[0] = 0
+    remap[found] = np.arange(2, found.sum() + 2, dtype='int32')
+
+    compact_matrix = np.zeros(
+        (found.sum() + 2, embeddings_matrix.shape[1]), dtype
+    )
+    compact_matrix[2:] = embeddings_matrix[found]
+
+    compact_word_index = {
+        word: int(remap[index]) for word, index in word_index.items()
+    }
+
+    full_size = embeddings_matrix.nbytes / 2 ** 20
+    compact_size = compact_matrix.nbytes / 2 ** 20
+    print(f'Compact embeddings matrix: {compact_matrix.shape[0]} rows '
+          f'({compact_size:.1f} MB, full matrix {full_size:.1f} MB, saved '
+          f'{full_size - compact_size:.1f} MB).')
+
+    return compact_matrix, compact_word_index, remap
+
+
+def get_file_hash(path, block_size=2 ** 20):
+    """
+    Get hash of file content.
+
+    :param path: str, path to file.
+    :param block_size: int, number of bytes read at once.
+    :return: str, hash of file content.
+    """
+    file_hash = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def get_dataset_cache_key(data_path, **params):
+    """
+    Get key of prepared dataset in cache.
+
+    :param data_path: str, path to data csv file.
+    :param params: dict, parameters used to prepare dataset.
+    :return: str, cache key (hash of data file and parameters).
+    """
+    params_str = ','.join(f'{k}={v}' for k, v in sorted(params.items()))
+    content = f'{get_file_hash(data_path)}:{params_str}'.encode('utf-8')
+
+    return hashlib.sha1(content).hexdigest()
+
+
+# Arrays of prepared dataset stored in cache as .npy files
+DATASET_ARRAYS = ['sequences', 'labels', 'train_indices', 'test_indices']
+
+
+def save_dataset_cache(cache_dir, word_index, **arrays):
+    """
+    Save prepared dataset into cache directory.
+
+    Dataset is written into temporary directory at first and renamed
+    then, so interrupted saving never leaves incomplete cache entry.
+
+    :param cache_dir: str, cache directory of dataset.
+    :param word_index: dict, word index table.
+    :param arrays: dict, arrays of dataset (see DATASET_ARRAYS).
+    """
+    tmp_dir = f'{cache_dir}.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    makedirs(tmp_dir)
+
+    for name in DATASET_ARRAYS:
+        np.save(join(tmp_dir, f'{name}.npy'), arrays[name])
+
+    with open(join(tmp_dir, 'word_index.obj'), 'wb') as f:
+        pickle.dump(word_index, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    rename(tmp_dir, cache_dir)
+
+
+def load_dataset_cache(cache_dir):
+    """
+    Load prepared dataset from cache directory.
+
+    Arrays are memory-mapped, so loading is fast even for large
+    datasets.
+
+    :param cache_dir: str, cache directory of dataset.
+    :return: (dict, dict), arrays of dataset (see DATASET_ARRAYS) and
+        word index table, None if dataset is not cached.
+    """
+    word_index_path = join(cache_dir, 'word_index.obj')
+    if not isfile(word_index_path):
+        return None
+
+    arrays = {
+        name: np.load(join(cache_dir, f'{name}.npy'), mmap_mode='r')
+        for name in DATASET_ARRAYS
+    }
+
+    with open(word_index_path, 'rb') as f:
+        word_index = pickle.load(f)
+
+    return arrays, word_index
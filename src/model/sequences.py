@@ -0,0 +1,168 @@
+import numpy as np
+
+
+def get_lengths(x):
+    """
+    Get lengths of post-padded sequences.
+
+    Length of sequence is position of its last non-padding word (unknown
+    words inside sequence are zeros as well).
+
+    :param x: numpy.ndarray, post-padded sequences (2D array).
+    :return: numpy.ndarray, length of each sequence.
+    """
+    nonzero = x != 0
+    return np.where(
+        nonzero.any(axis=1),
+        x.shape[1] - np.argmax(nonzero[:, ::-1], axis=1),
+        0
+    )
+
+
+def fit_sequences(x, length, lengths=None):
+    """
+    Pad or truncate post-padded sequences to given length.
+
+    Too long sequences are truncated from the beginning (their last
+    `length` words are kept), the same as in training.
+
+    :param x: numpy.ndarray, post-padded sequences (2D array).
+    :param length: int, length of result sequences.
+    :param lengths: numpy.ndarray, lengths of sequences (computed if
+        None).
+    :return: numpy.ndarray, sequences of given length.
+    """
+    if x.shape[1] < length:
+        return np.pad(x, ((0, 0), (0, length - x.shape[1])))
+    if x.shape[1] == length:
+        return x
+
+    if lengths is None:
+        lengths = get_lengths(x)
+    starts = np.maximum(lengths - length, 0)
+    cols = starts[:, None] + np.arange(length)
+
+    return np.take_along_axis(x, cols, axis=1)
+
+
+# Strategies of limiting length of long documents and aggregations of
+# predictions of their windows
+STRATEGIES = ('tail', 'head', 'head_tail', 'windows')
+AGGREGATIONS = ('mean', 'max')
+
+
+class SequenceWindowing:
+    """
+    Limit length of sequences predicted by model, so latency of
+    prediction of any document is bounded.
+
+    Sequences longer than `max_len` are replaced by windows of at most
+    `max_len` words according to strategy:
+    - tail - the last `max_len` words (the same as in training),
+    - head - the first `max_len` words,
+    - head_tail - the first quarter and the last three quarters of
+        `max_len` words,
+    - windows - up to `max_windows` evenly spaced windows covering the
+        whole sequence (if possible), their predictions are aggregated.
+
+    :param max_len: int, maximum length of window (`max_seq_len` of
+        training).
+    :param strategy: str, strategy of windowing (see `STRATEGIES`).
+    :param aggregation: str, aggregation of predictions of windows of
+        one sequence, 'mean' or 'max'.
+    :param max_windows: int, maximum number of windows of one sequence.
+    """
+
+    def __init__(self, max_len, strategy='tail', aggregation='mean',
+                 max_windows=4):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown strategy: {strategy}.')
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f'Unknown aggregation: {aggregation}.')
+        if max_len < 1 or max_windows < 1:
+            raise ValueError('Window length and number of windows have to '
+                             'be positive.')
+
+        self.max_len = int(max_len)
+        self.strategy = strategy
+        self.aggregation = aggregation
+        self.max_windows = int(max_windows)
+
+    def get_id(self):
+        """
+        Get identifier of windowing (windowing changes predictions, so
+        it is part of cache key).
+
+        :return: str, identifier of windowing.
+        """
+        if self.strategy != 'windows':
+            return f'{self.strategy}:{self.max_len}'
+
+        return f'{self.strategy}:{self.max_len}:{self.max_windows}:' \
+               f'{self.aggregation}'
+
+    def get_windows(self, sequence):
+        """
+        Get windows of sequence.
+
+        :param sequence: list|numpy.ndarray, sequence of word indexes.
+        :return: list, list of windows (sequences).
+        """
+        length = len(sequence)
+        if length <= self.max_len:
+            return [sequence]
+
+        if self.strategy == 'tail':
+            return [sequence[length - self.max_len:]]
+        if self.strategy == 'head':
+            return [sequence[:self.max_len]]
+        if self.strategy == 'head_tail':
+            head_len = self.max_len // 4
+            tail_len = self.max_len - head_len
+            return [list(sequence[:head_len]) +
+                    list(sequence[length - tail_len:])]
+
+        num_windows = min(self.max_windows, -(-length // self.max_len))
+        starts = np.linspace(0, length - self.max_len, num_windows)
+
+        return [
+            sequence[start:start + self.max_len]
+            for start in np.round(starts).astype(int)
+        ]
+
+    def predict(self, predict_fn, sequences):
+        """
+        Predict sequences by their windows.
+
+        Windows of all sequences are predicted at once (as one list of
+        sequences) and predictions of windows of each sequence are
+        aggregated.
+
+        :param predict_fn: callable, function predicting list of
+            sequences and returning array of predictions.
+        :param sequences: list, list of sequences.
+        :return: numpy.ndarray, prediction of each sequence.
+        """
+        if not len(sequences):
+            return np.zeros(0, dtype='float32')
+
+        windows, owners = [], []
+        for i, sequence in enumerate(sequences):
+            sequence_windows = self.get_windows(sequence)
+            windows.extend(sequence_windows)
+            owners.extend([i] * len(sequence_windows))
+
+        scores = np.asarray(predict_fn(windows), dtype='float32').reshape(-1)
+        if len(windows) == len(sequences):
+            return scores
+
+        owners = np.asarray(owners)
+        if self.aggregation == 'max':
+            predictions = np.full(len(sequences), -np.inf, dtype='float32')
+            np.maximum.at(predictions, owners, scores)
+            return predictions
+
+        return (
+            np.bincount(owners, weights=scores, minlength=len(sequences)) /
+            np.bincount(owners, minlength=len(sequences))
+        ).astype('float32')
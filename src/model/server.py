@@ -0,0 +1,346 @@
+import json
+import queue
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from predict import load_model, load_word_index, get_max_seq_len, \
+    predict_texts, get_windowing, add_windowing_arguments
+from inference import CompiledPredictor, get_bucket_lengths, \
+    get_inference_mode
+from prediction_cache import PredictionCache, get_model_id
+from tflite_predictor import TFLitePredictor, get_tflite_path
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent prediction requests into micro-batches.
+
+    Texts submitted from request threads are queued and a single worker
+    thread collects them into batches. Batch is predicted once it has
+    `max_batch_size` texts or `max_wait` seconds passed since its first
+    text arrived. If prediction of batch fails, its texts are predicted
+    one by one, so only futures of failing texts get the exception.
+
+    :param predict_fn: callable, function predicting list of texts and
+        returning list of predictions.
+    :param max_batch_size: int, maximum number of texts in batch.
+    :param max_wait: float, maximum time (in seconds) to wait for batch
+        to be filled.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait=0.01):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, text):
+        """
+        Submit text to be predicted in next batch.
+
+        :param text: str, text to be predicted.
+        :return: concurrent.futures.Future, future of prediction.
+        """
+        future = Future()
+        self.queue.put((text, future))
+        return future
+
+    def _collect_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for text, _ in batch]
+
+            try:
+                predictions = self.predict_fn(texts)
+            except Exception:
+                self._predict_separately(batch)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+
+    def _predict_separately(self, batch):
+        for text, future in batch:
+            try:
+                future.set_result(self.predict_fn([text])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of prediction HTTP requests.
+
+    Endpoints:
+    - GET /health - check whether server is running.
+    - GET /metrics - get metrics of prediction cache (hits, misses,
+        hit rate).
+    - POST /predict - predict texts, request body is JSON object with
+        either `text` (str) or `texts` (list of str) key, response is
+        JSON object with `predictions` (list of scores, null for texts
+        filtered out by preprocessing). Bodies larger than
+        `max_body_size` bytes are rejected.
+    """
+
+    batcher = None
+    model_name = None
+    cache = None
+    max_body_size = 10 * 1024 ** 2
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, {'status': 'ok', 'model': self.model_name})
+        elif self.path == '/metrics':
+            self.send_json(200, {
+                'model': self.model_name,
+                'cache': None if self.cache is None
+                else self.cache.get_stats()
+            })
+        else:
+            self.send_json(404, {'error': 'Not found.'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.send_json(404, {'error': 'Not found.'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_json(400, {'error': 'Invalid Content-Length.'})
+            return
+        if length > self.max_body_size:
+            self.send_json(413, {'error': f'Request body exceeds '
+                                          f'{self.max_body_size} bytes.'})
+            return
+
+        try:
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+            texts = data['texts'] if 'texts' in data else [data['text']]
+            if not isinstance(texts, list):
+                raise ValueError('Texts have to be list.')
+            if not all(isinstance(text, str) for text in texts):
+                raise ValueError('Texts have to be strings.')
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f'Invalid request: {e}'})
+            return
+
+        futures = [self.batcher.submit(text) for text in texts]
+
+        try:
+            predictions = [future.result() for future in futures]
+        except Exception as e:
+            self.send_json(500, {'error': f'Prediction failed: {e}'})
+            return
+
+        self.send_json(200, {'predictions': predictions})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PredictionServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each request in separate thread."""
+
+    daemon_threads = True
+
+
+def parse_arguments():
+    """
+    Parse script call arguments.
+
+    :return: argparse.Namespace, arguments namespace object.
+    """
+    parser = ArgumentParser()
+
+    parser.add_argument("-m", "--model", dest="model_name", required=True,
+                        help="Model name (folder, where model is stored).")
+    parser.add_argument("--host", dest="host", default='0.0.0.0',
+                        help="Host to listen on.")
+    parser.add_argument("-p", "--port", dest="port", default=8000, type=int,
+                        help="Port to listen on.")
+    parser.add_argument("-bs", "--max-batch-size", dest="max_batch_size",
+                        default=32, type=int,
+                        help="Maximum number of texts predicted at once.")
+    parser.add_argument("-w", "--max-wait", dest="max_wait", default=10,
+                        type=float,
+                        help="Maximum time (in milliseconds) to wait for "
+                             "batch to be filled.")
+    parser.add_argument("--compiled", dest="compiled", action='store_true',
+                        help="Predict with compiled forward pass of fixed "
+                             "sequence lengths.")
+    parser.add_argument("--jit", dest="jit", action='store_true',
+                        help="Compile forward pass with XLA (requires "
+                             "--compiled).")
+    parser.add_argument("--tflite", dest="tflite", default=None,
+                        choices=['float32', 'float16', 'int8'],
+                        help="Predict with model exported to TensorFlow "
+                             "Lite with given quantization (see export.py).")
+    parser.add_argument("--cache-size", dest="cache_size", default=10000,
+                        type=int,
+                        help="Number of predictions cached in memory "
+                             "(0 disables cache).")
+    parser.add_argument("--cache-path", dest="cache_path", default=None,
+                        help="SQLite database with cached predictions "
+                             "shared between runs.")
+    parser.add_argument("--cache-ttl", dest="cache_ttl", default=None,
+                        type=float,
+                        help="Time to live of cached predictions in hours.")
+    parser.add_argument("--max-body-size", dest="max_body_size", default=10,
+                        type=float,
+                        help="Maximum size of request body in megabytes.")
+    add_windowing_arguments(parser)
+    return parser.parse_args()
+
+
+def serve(model_name, host='0.0.0.0', port=8000, max_batch_size=32,
+          max_wait=0.01, compiled=False, jit=False, tflite=None,
+          cache_size=10000, cache_path=None, cache_ttl=None,
+          strategy='tail', aggregation='mean', max_windows=4,
+          max_body_size=10 * 1024 ** 2):
+    """
+    Load model once and serve predictions over HTTP.
+
+    :param model_name: str, name of model to be used for prediction.
+    :param host: str, host to listen on.
+    :param port: int, port to listen on.
+    :param max_batch_size: int, maximum number of texts in batch.
+    :param max_wait: float, maximum time (in seconds) to wait for batch
+        to be filled.
+    :param compiled: bool, whether to predict with compiled forward pass
+        (see `CompiledPredictor`), warmed up before serving.
+    :param jit: bool, whether to compile forward pass with XLA.
+    :param tflite: str, quantization of model exported to TensorFlow
+        Lite to be used instead of keras model (None for keras model).
+    :param cache_size: int, number of predictions cached in memory (no
+        cache if 0 and `cache_path` is None).
+    :param cache_path: str, path to SQLite database with cached
+        predictions (no disk cache if None).
+    :param cache_ttl: float, time to live of cached predictions in
+        seconds (no expiration if None).
+    :param strategy: str, strategy of predicting texts longer than
+        maximum sequence length of training (see `SequenceWindowing`).
+    :param aggregation: str, aggregation of predictions of windows.
+    :param max_windows: int, maximum number of windows of one text.
+    :param max_body_size: int, maximum size of request body in bytes.
+    """
+    print('Loading model...')
+    word_index = load_word_index(model_name)
+
+    windowing = get_windowing(model_name, strategy, aggregation, max_windows)
+
+    # Windows have to fit into model input, otherwise they would be
+    # truncated from the beginning (e.g. head of text would be lost)
+    max_seq_len = get_max_seq_len(model_name) if windowing is None \
+        else windowing.max_len
+
+    if tflite is not None:
+        model = TFLitePredictor(
+            get_tflite_path(model_name, tflite),
+            max_seq_len=max_seq_len
+        )
+    else:
+        model = load_model(model_name)
+
+    if compiled and tflite is None:
+        print('Compiling model...')
+        model = CompiledPredictor(
+            model,
+            lengths=get_bucket_lengths(max_seq_len),
+            jit=jit,
+            warmup_batch_sizes=(1, max_batch_size)
+        )
+
+    cache = None
+    if cache_size > 0 or cache_path is not None:
+        cache = PredictionCache(
+            get_model_id(
+                model_name,
+                tflite,
+                None if windowing is None else windowing.get_id(),
+                get_inference_mode(compiled, jit)
+            ),
+            max_size=cache_size,
+            path=cache_path,
+            ttl=cache_ttl
+        )
+
+    PredictionRequestHandler.model_name = model_name
+    PredictionRequestHandler.cache = cache
+    PredictionRequestHandler.max_body_size = max_body_size
+    PredictionRequestHandler.batcher = MicroBatcher(
+        lambda texts: predict_texts(
+            model, word_index, texts, cache, windowing
+        ),
+        max_batch_size=max_batch_size,
+        max_wait=max_wait
+    )
+
+    server = PredictionServer((host, port), PredictionRequestHandler)
+    print(f'Serving predictions on http://{host}:{port}/predict')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    if args.max_batch_size < 1:
+        sys.exit('Argument --max-batch-size/-bs has to be positive.')
+
+    serve(
+        model_name=args.model_name,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait / 1000,
+        compiled=args.compiled,
+        jit=args.jit,
+        tflite=args.tflite,
+        cache_size=args.cache_size,
+        cache_path=args.cache_path,
+        cache_ttl=None if args.cache_ttl is None else args.cache_ttl * 3600,
+        strategy=args.strategy,
+        aggregation=args.aggregation,
+        max_windows=args.max_windows,
+        max_body_size=int(args.max_body_size * 1024 ** 2)
+    )
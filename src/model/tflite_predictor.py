@@ -0,0 +1,127 @@
+from os.path import dirname, join
+import numpy as np
+from sequences import get_lengths, fit_sequences
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    # Full TensorFlow is used only if lightweight runtime is missing
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+
+
+def get_tflite_path(training_name, quantization='float16'):
+    """
+    Get path to model exported to TensorFlow Lite.
+
+    :param training_name: str, name of training.
+    :param quantization: str, quantization of model.
+    :return: str, path to .tflite model.
+    """
+    return join(
+        dirname(__file__),
+        f'../../models/{training_name}/model-{quantization}.tflite'
+    )
+
+
+class TFLitePredictor:
+    """
+    Predictor running model exported to TensorFlow Lite (see
+    `export.py`).
+
+    Uses `tflite_runtime` if installed, so neither keras nor full
+    TensorFlow has to be loaded. Models exported with fixed batch size 1
+    predict sequences one by one (each only as long as it is), other
+    models predict whole batch at once.
+
+    Predictor can be used in place of keras model for prediction
+    (`predict` and `predict_on_batch` methods).
+
+    :param model_path: str, path to .tflite model.
+    :param max_seq_len: int, maximum length of sequences (longer are
+        truncated from the beginning), no limit if None.
+    :param num_threads: int, number of threads used by interpreter
+        (default of interpreter if None or if interpreter does not
+        support it, e.g. in TensorFlow 2.0).
+    """
+
+    def __init__(self, model_path, max_seq_len=None, num_threads=None):
+        self.max_seq_len = max_seq_len
+        self.interpreter = None
+        if num_threads is not None:
+            try:
+                self.interpreter = Interpreter(
+                    model_path=model_path,
+                    num_threads=num_threads
+                )
+            except TypeError:
+                print('Warning: TensorFlow Lite interpreter does not support '
+                      'setting number of threads, default is used.')
+        if self.interpreter is None:
+            self.interpreter = Interpreter(model_path=model_path)
+
+        input_details = self.interpreter.get_input_details()[0]
+        self.input_index = input_details['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        shape = input_details.get('shape_signature', input_details['shape'])
+        self.fixed_batch = shape[0] == 1
+
+        self.input_shape = None
+
+    def invoke(self, x):
+        """
+        Run interpreter on input (resized only if its shape changed).
+
+        :param x: numpy.ndarray, int32 input of model.
+        :return: numpy.ndarray, output of model.
+        """
+        if x.shape != self.input_shape:
+            self.interpreter.resize_tensor_input(self.input_index, x.shape)
+            self.interpreter.allocate_tensors()
+            self.input_shape = x.shape
+
+        self.interpreter.set_tensor(self.input_index, x)
+        self.interpreter.invoke()
+
+        return self.interpreter.get_tensor(self.output_index).copy()
+
+    def predict_on_batch(self, x):
+        """
+        Predict batch of sequences.
+
+        :param x: numpy.ndarray, post-padded sequences (2D array).
+        :return: numpy.ndarray, predictions of shape (batch size, 1).
+        """
+        x = np.asarray(x, dtype='int32')
+        if not len(x):
+            return np.zeros((0, 1), dtype='float32')
+
+        lengths = get_lengths(x)
+        if self.max_seq_len is not None:
+            lengths = np.minimum(lengths, self.max_seq_len)
+        x = fit_sequences(x, max(1, int(lengths.max())), get_lengths(x))
+
+        if not self.fixed_batch:
+            return self.invoke(x)
+
+        return np.concatenate([
+            self.invoke(sequence[None, :max(1, length)])
+            for sequence, length in zip(x, lengths)
+        ])
+
+    def predict(self, x, batch_size=32):
+        """
+        Predict sequences in batches.
+
+        :param x: numpy.ndarray, post-padded sequences (2D array).
+        :param batch_size: int, number of sequences predicted at once.
+        :return: numpy.ndarray, predictions of shape (samples, 1).
+        """
+        x = np.asarray(x, dtype='int32')
+        if not len(x):
+            return np.zeros((0, 1), dtype='float32')
+
+        return np.concatenate([
+            self.predict_on_batch(x[start:start + batch_size])
+            for start in range(0, len(x), batch_size)
+        ])
@@ -0,0 +1,197 @@
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+import numpy as np
+
+# Characters removed from texts (the same as in keras Tokenizer)
+FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+TRANSLATE_MAP = str.maketrans({character: ' ' for character in FILTERS})
+
+# Word lookup table used by worker processes
+_lookup = None
+
+
+def text_to_words(text):
+    """
+    Split text to words the same way as keras Tokenizer does.
+
+    :param text: str, text to be split.
+    :return: list, list of words.
+    """
+    return [
+        word for word in text.lower().translate(TRANSLATE_MAP).split(' ')
+        if word
+    ]
+
+
+def count_words(texts):
+    """
+    Count words in texts.
+
+    :param texts: list, list of texts.
+    :return: collections.Counter, counts of words (in order of first
+        occurrence).
+    """
+    counts = Counter()
+    for text in texts:
+        for word in text_to_words(text):
+            counts[word] += 1
+
+    return counts
+
+
+def set_lookup(lookup):
+    global _lookup
+    _lookup = lookup
+
+
+def texts_to_ids(texts):
+    """
+    Convert texts to word ids using lookup table set by `set_lookup`.
+
+    :param texts: list, list of texts.
+    :return: (numpy.ndarray, numpy.ndarray), concatenated ids of all
+        texts and number of ids of each text.
+    """
+    ids = []
+    lengths = np.zeros(len(texts), dtype='int64')
+    for i, text in enumerate(texts):
+        text_ids = [
+            _lookup[word] for word in text_to_words(text) if word in _lookup
+        ]
+        ids.extend(text_ids)
+        lengths[i] = len(text_ids)
+
+    return np.asarray(ids, dtype='int32'), lengths
+
+
+def split_chunks(values, num_chunks):
+    """
+    Split list of values into chunks of similar size.
+
+    :param values: list, values to be split.
+    :param num_chunks: int, number of chunks.
+    :return: list, list of chunks.
+    """
+    chunk_size = max(1, -(-len(values) // num_chunks))
+    return [
+        values[i:i + chunk_size] for i in range(0, len(values), chunk_size)
+    ]
+
+
+class ParallelTokenizer:
+    """
+    Tokenizer building vocabulary and sequences in multiple processes.
+
+    Tokenizer is compatible with keras Tokenizer (the same splitting of
+    texts, the same word index and sequences), but counts words in
+    chunks of texts in parallel and converts texts directly into
+    preallocated padded matrix.
+
+    :param num_words: int, maximum number of words to keep (only words
+        with index lower than num_words are used in sequences).
+    :param n_jobs: int, number of processes (all CPUs if -1).
+    """
+
+    def __init__(self, num_words=None, n_jobs=1):
+        self.num_words = num_words
+        self.n_jobs = cpu_count() if n_jobs == -1 else (n_jobs or 1)
+        self.word_counts = Counter()
+        self.word_index = {}
+
+    def map(self, func, texts, initializer=None, initargs=()):
+        """
+        Apply function on chunks of texts, in process pool if n_jobs > 1.
+
+        :param func: callable, function applied on chunk of texts.
+        :param texts: list, list of texts.
+        :param initializer: callable, initializer of processes.
+        :param initargs: tuple, arguments of initializer.
+        :return: list, results for chunks (in order of texts).
+        """
+        if self.n_jobs <= 1 or len(texts) < 2:
+            if initializer is not None:
+                initializer(*initargs)
+            return [func(texts)]
+
+        chunks = split_chunks(texts, self.n_jobs * 4)
+        with Pool(self.n_jobs, initializer, initargs) as pool:
+            return pool.map(func, chunks)
+
+    def fit_on_texts(self, texts):
+        """
+        Build vocabulary from texts.
+
+        Words are counted in chunks of texts and counters are merged in
+        order of chunks, so ties are broken by first occurrence of word
+        exactly as in keras Tokenizer.
+
+        :param texts: list, list of texts.
+        :return: ParallelTokenizer, fitted tokenizer.
+        """
+        texts = list(texts)
+        for counts in self.map(count_words, texts):
+            self.word_counts.update(counts)
+
+        sorted_words = sorted(
+            self.word_counts.items(),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        self.word_index = {
+            word: index for index, (word, _) in enumerate(sorted_words, 1)
+        }
+
+        return self
+
+    def get_lookup(self):
+        """
+        Get word index restricted to top `num_words` words.
+
+        :return: dict, dictionary of format 'word: index'.
+        """
+        if self.num_words is None:
+            return self.word_index
+
+        return {
+            word: index for word, index in self.word_index.items()
+            if index < self.num_words
+        }
+
+    def texts_to_padded_sequences(self, texts, maxlen=None):
+        """
+        Convert texts to post-padded matrix of word indexes.
+
+        Result is the same as `pad_sequences(texts_to_sequences(texts),
+        padding='post', maxlen=maxlen)` of keras (too long sequences are
+        truncated from the beginning).
+
+        :param texts: list, list of texts.
+        :param maxlen: int, maximum length of sequences (length of the
+            longest sequence if None).
+        :return: numpy.ndarray, int32 matrix of padded sequences.
+        """
+        texts = list(texts)
+        results = self.map(
+            texts_to_ids, texts,
+            initializer=set_lookup,
+            initargs=(self.get_lookup(),)
+        )
+        ids = np.concatenate([result[0] for result in results])
+        lengths = np.concatenate([result[1] for result in results])
+
+        if maxlen is None:
+            maxlen = int(lengths.max()) if len(lengths) else 0
+
+        # Keep last `maxlen` ids of each sequence
+        kept = np.minimum(lengths, maxlen)
+        offsets = np.cumsum(lengths) - lengths
+        starts = offsets + lengths - kept
+
+        rows = np.repeat(np.arange(len(texts)), kept)
+        kept_offsets = np.cumsum(kept) - kept
+        cols = np.arange(kept.sum()) - np.repeat(kept_offsets, kept)
+
+        sequences = np.zeros((len(texts), maxlen), dtype='int32')
+        sequences[rows, cols] = ids[np.repeat(starts, kept) + cols]
+
+        return sequences
@@ -1,16 +1,24 @@
 import gc
+import json
+import sys
 from os import makedirs
-from os.path import dirname, join
+from os.path import dirname, join, isfile, abspath
 import datetime
 import numpy as np
 from config import parse_input_parameters, get_config
 from model import FakeNewsDetectionNet
 from preprocessing import read_data, get_sequences_and_word_index, split_data,\
-    get_embeddings_matrix
-from fasttext import read_fasttext_model
+    get_embeddings_matrix, get_data_path, get_dataset_cache_key, \
+    load_dataset_cache, save_dataset_cache, get_bucketed_dataset, \
+    compact_embeddings
+from fasttext import load_fasttext_model, read_fasttext_embeddings, \
+    get_binary_paths
 import tensorflow.keras as keras
 import pickle
 
+sys.path.append(abspath(join(dirname(__file__), '../../')))
+from src.data.preprocessing import preprocess_data, get_preprocessing_version
+
 
 def get_model(
         dim_input,
@@ -53,31 +61,131 @@ def prepare_data(
         max_words=None,
         test_size=0.15,
         max_seq_len=None,
-        samples=None
+        samples=None,
+        cache=True,
+        n_jobs=1,
+        preprocess=False,
+        preprocessing_cache_dir=None,
+        language_sample_size=None,
+        language_cache=None
 ):
     """
     Function to load and prepare data for training.
 
+    Prepared data (padded sequences, labels, train test split and word
+    index) are cached, so next training with the same data file and
+    parameters loads them instead of preparing again.
+
     :param data_path: str, path where csv file is stored.
     :param max_words: int, maximum number of top words in vocabulary.
     :param test_size: float, train test split rate.
     :param max_seq_len: int, maximum length of all sequences.
     :param samples: int, number of samples from data to choose.
+    :param cache: bool, whether to use cache of prepared data.
+    :param n_jobs: int, number of processes used by tokenizer (and by
+        preprocessing).
+    :param preprocess: bool, whether data file is raw and has to be
+        preprocessed (see `src.data.preprocessing.preprocess_data`).
+    :param preprocessing_cache_dir: str, directory of cached results of
+        preprocessing steps (no caching if None).
+    :param language_sample_size: int, number of characters of article
+        used for language detection in preprocessing (whole article if
+        None).
+    :param language_cache: str, path to SQLite database used as cache of
+        detected languages (no caching if None).
     :return: list, list of data and word index in format:
         x_train, x_test, y_train, y_test, word_index
     """
+    cache_dir = None
+    if cache:
+        cache_key = get_dataset_cache_key(
+            get_data_path(data_path),
+            max_words=None if max_words is None else int(max_words),
+            max_seq_len=None if max_seq_len is None else int(max_seq_len),
+            samples=None if samples is None else int(samples),
+            test_size=None if test_size is None else float(test_size),
+            preprocessing=get_preprocessing_version() if preprocess else None,
+            language_sample_size=language_sample_size if preprocess else None
+        )
+        cache_dir = join(
+            dirname(__file__),
+            f'../../data/cache/datasets/{cache_key}'
+        )
+
+        cached = load_dataset_cache(cache_dir)
+        if cached is not None:
+            print('Loading prepared data from cache...')
+            arrays, word_index = cached
+            sequences, labels = arrays['sequences'], arrays['labels']
+            train_indices = arrays['train_indices']
+            test_indices = arrays['test_indices']
+
+            return sequences[train_indices], sequences[test_indices], \
+                labels[train_indices], labels[test_indices], word_index
+
     data = read_data(data_path, samples)
+    if preprocess:
+        data = preprocess_data(
+            [data],
+            n_jobs=n_jobs,
+            cache_dir=preprocessing_cache_dir,
+            language_sample_size=language_sample_size,
+            language_cache=language_cache
+        )[0]
 
     labels = np.asarray(data['label'])
     sequences, word_index = get_sequences_and_word_index(
-        data['body'], max_words, max_seq_len
+        data['body'].tolist(), max_words, max_seq_len, n_jobs
     )
 
     print(f'Sequences shape: {sequences.shape}')
 
-    x_train, x_test, y_train, y_test = split_data(sequences, labels, test_size)
+    # Split indices, so the split can be cached (it is the same split
+    # as splitting sequences directly)
+    train_indices, test_indices, y_train, y_test = split_data(
+        np.arange(len(labels)), labels, test_size
+    )
 
-    return x_train, x_test, y_train, y_test, word_index
+    if cache_dir is not None:
+        save_dataset_cache(
+            cache_dir,
+            word_index,
+            sequences=sequences,
+            labels=labels,
+            train_indices=train_indices,
+            test_indices=test_indices
+        )
+
+    return sequences[train_indices], sequences[test_indices], \
+        y_train, y_test, word_index
+
+
+def get_embeddings(word_index, fasttext_path, embeddings_dim,
+                   dtype='float32', return_stats=False):
+    """
+    Function to get embeddings matrix for vocabulary from fastText model.
+
+    If binary fastText store exists, it is memory-mapped and used for
+    lookup, otherwise .vec file is streamed and only vectors of words
+    from vocabulary are read.
+
+    :param word_index: dict, dictionary of format 'word: index'.
+    :param fasttext_path: str, path to fastText model in .vec format.
+    :param embeddings_dim: int, embeddings dimension (len of vectors).
+    :param dtype: str, data type of embeddings matrix.
+    :param return_stats: bool, whether to return also lookup statistics.
+    :return: numpy.array|(numpy.array, dict), embeddings matrix (and
+        lookup statistics).
+    """
+    if all(isfile(path) for path in get_binary_paths(fasttext_path)):
+        fasttext = load_fasttext_model(fasttext_path)
+        return get_embeddings_matrix(
+            word_index, fasttext, embeddings_dim, dtype, return_stats
+        )
+
+    return read_fasttext_embeddings(
+        fasttext_path, word_index, embeddings_dim, dtype, return_stats
+    )
 
 
 def get_callbacks(training_name):
@@ -130,6 +238,17 @@ def train(config):
         f'../../models/{training_name}'
     ))
 
+    # Config is stored with model, so prediction and export use the same
+    # sequence length and data split as training
+    with open(
+            join(
+                dirname(__file__),
+                f'../../models/{training_name}/config.json'
+            ),
+            'w'
+    ) as f:
+        json.dump({**config, 'name': training_name}, f, indent=4)
+
     # Read the data and get word index
     print('Preparing data...')
     x_train, x_test, y_train, y_test, word_index = prepare_data(
@@ -137,9 +256,41 @@ def train(config):
         max_words=config.get('max_words', None),
         test_size=config.get('test_size', None),
         max_seq_len=config.get('max_seq_len', None),
-        samples=config.get('num_samples', None)
+        samples=config.get('num_samples', None),
+        cache=config.get('cache_dataset', True),
+        n_jobs=int(config.get('tokenizer_jobs', 1)),
+        preprocess=config.get('preprocess', False),
+        preprocessing_cache_dir=config.get('preprocessing_cache_dir', None),
+        language_sample_size=config.get('language_sample_size', None),
+        language_cache=config.get('language_cache', None)
     )
     print(f'Data prepared. Vocabulary size: {len(word_index)}.')
+
+    print('Creating embeddings matrix...')
+    embeddings_dtype = config.get('embeddings_dtype', 'float32')
+    embeddings_matrix, embeddings_stats = get_embeddings(
+        word_index,
+        join(dirname(__file__), '../../models/fasttext/wiki-news-300d-1M.vec'),
+        300,
+        embeddings_dtype,
+        return_stats=True
+    )
+    print(f'Pre-trained vectors found for {embeddings_stats["found"]} of '
+          f'{embeddings_stats["words"]} words (coverage '
+          f'{embeddings_stats["coverage"]:.2%}).')
+
+    if config.get('compact_embeddings', False):
+        # Words without pre-trained vector share one OOV row, so word
+        # index and sequences are remapped to rows of compact matrix
+        embeddings_matrix, word_index, remap = compact_embeddings(
+            embeddings_matrix, word_index, embeddings_dtype
+        )
+        x_train, x_test = remap[x_train], remap[x_test]
+
+    print(f'Embeddings matrix: {embeddings_matrix.shape} '
+          f'{embeddings_matrix.dtype} '
+          f'({embeddings_matrix.nbytes / 2 ** 20:.1f} MB).')
+
     print('Serializing word index table...')
     pickle.dump(
         word_index,
@@ -152,23 +303,8 @@ def train(config):
         )
     )
 
-    print('Reading fastText model...')
-    # Read pre-trained fasttext embeddings
-    fasttext = read_fasttext_model(
-        join(dirname(__file__), '../../models/fasttext/wiki-news-300d-1M.vec')
-    )
+    vocabulary_size = len(embeddings_matrix)
 
-    print('Creating embeddings matrix...')
-    # Get filtered embeddings matrix
-    embeddings_matrix = get_embeddings_matrix(
-        word_index,
-        fasttext,
-        300
-    )
-
-    vocabulary_size = len(word_index)
-
-    del fasttext
     del word_index
     gc.collect()
 
@@ -183,15 +319,34 @@ def train(config):
         int(config.get('num_hidden_layers'))
     )
 
+    batch_size = int(config.get('batch_size', 0))
+
     print('Training the model...')
-    model.fit(
-        x=x_train,
-        y=y_train,
-        batch_size=int(config.get('batch_size', 0)),
-        validation_data=(x_test, y_test),
-        callbacks=get_callbacks(training_name),
-        epochs=int(config.get('epochs', 0))
-    )
+    if config.get('bucketing', False):
+        # Batches of sequences with similar length, padded only to
+        # their bucket boundary
+        bucket_boundaries = config.get(
+            'bucket_boundaries', [64, 128, 256, 512, 1024, 2048]
+        )
+        model.fit(
+            x=get_bucketed_dataset(
+                x_train, y_train, batch_size, bucket_boundaries
+            ),
+            validation_data=get_bucketed_dataset(
+                x_test, y_test, batch_size, bucket_boundaries, shuffle=False
+            ),
+            callbacks=get_callbacks(training_name),
+            epochs=int(config.get('epochs', 0))
+        )
+    else:
+        model.fit(
+            x=x_train,
+            y=y_train,
+            batch_size=batch_size,
+            validation_data=(x_test, y_test),
+            callbacks=get_callbacks(training_name),
+            epochs=int(config.get('epochs', 0))
+        )
 
     model.summary()
 
@@ -0,0 +1,35 @@
+import re
+import sys
+from os.path import abspath, dirname, join
+import nltk
+import pytest
+
+# Scripts in src/model and src/data/retrieval import their siblings
+# directly
+sys.path.append(abspath(join(dirname(__file__), '..')))
+sys.path.append(abspath(join(dirname(__file__), '../src/model')))
+sys.path.append(abspath(join(dirname(__file__), '../src/data/retrieval')))
+
+
+def has_punkt():
+    for resource in ('tokenizers/punkt_tab/english/', 'tokenizers/punkt'):
+        try:
+            nltk.data.find(resource)
+            return True
+        except LookupError:
+            continue
+    return False
+
+
+@pytest.fixture(autouse=True)
+def sentence_tokenizer(monkeypatch):
+    """
+    Split sentences on punctuation, if punkt data (downloaded in docker
+    image) are not installed, so preprocessing can run in tests.
+    """
+    if not has_punkt():
+        import src.data.pipelines as ppl
+        monkeypatch.setattr(
+            ppl, 'sent_tokenize',
+            lambda text: [s for s in re.split(r'(?<=[.!?])\s+', text) if s]
+        )
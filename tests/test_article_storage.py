@@ -0,0 +1,41 @@
+import gzip
+import pytest
+from article_storage import JsonlShardsStorage
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_partial_line_is_removed_on_open(tmp_path, compress):
+    storage = JsonlShardsStorage(str(tmp_path), compress=compress)
+    storage.save([{'id': 1}, {'id': 2}])
+
+    # Interrupted write of third record
+    path = storage.get_shard_path(0)
+    if compress:
+        with gzip.open(path, 'at') as f:
+            f.write('{"id": 3, "a"')
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-6])
+    else:
+        with open(path, 'a') as f:
+            f.write('{"id": 3, "a"')
+
+    storage = JsonlShardsStorage(str(tmp_path), compress=compress)
+    storage.save([{'id': 4}, {'id': 5}])
+
+    assert storage.get(4) == {'id': 4}
+    assert storage.get(5) == {'id': 5}
+    assert sorted(record['id'] for record in storage) == [1, 2, 4, 5]
+
+
+def test_invalid_lines_are_skipped(tmp_path):
+    storage = JsonlShardsStorage(str(tmp_path))
+    storage.save([{'id': 1}])
+    with open(storage.get_shard_path(0), 'a') as f:
+        f.write('{"id": 2, "a"\n')
+
+    storage = JsonlShardsStorage(str(tmp_path))
+    storage.save([{'id': 3}])
+
+    assert [record['id'] for record in storage] == [1, 3]
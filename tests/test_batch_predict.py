@@ -0,0 +1,45 @@
+import csv
+import numpy as np
+import pytest
+import batch_predict
+from test_predict import ARTICLE
+
+
+class LengthModel:
+
+    def predict_on_batch(self, x):
+        return (np.count_nonzero(x, axis=1)[:, None] / 1000).astype('float32')
+
+
+@pytest.fixture
+def model(monkeypatch):
+    word_index = {word: i + 1 for i, word in enumerate(
+        set(ARTICLE.lower().replace('.', ' ').split())
+    )}
+    monkeypatch.setattr(batch_predict, 'load_model', lambda name: LengthModel())
+    monkeypatch.setattr(batch_predict, 'load_word_index',
+                        lambda name: word_index)
+    monkeypatch.setattr(batch_predict, 'get_windowing', lambda *args: None)
+
+
+def read_predictions(path):
+    with open(path, 'r') as f:
+        return [row['prediction'] for row in csv.DictReader(f)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5])
+def test_duplicates_are_predicted_for_any_chunk_size(model, tmp_path,
+                                                     chunk_size):
+    input_path = tmp_path / 'articles.csv'
+    output_path = tmp_path / 'predictions.csv'
+    with open(input_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['body'])
+        writer.writerows([[ARTICLE]] * 5)
+
+    batch_predict.batch_predict('model', str(input_path), str(output_path),
+                                chunk_size=chunk_size)
+
+    predictions = read_predictions(output_path)
+    assert len(predictions) == 5
+    assert len(set(predictions)) == 1 and predictions[0] != ''
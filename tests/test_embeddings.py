@@ -0,0 +1,19 @@
+import numpy as np
+from preprocessing import get_embeddings_matrix
+
+
+def test_vectors_of_other_dimension_are_skipped():
+    # Header line of .vec file ('1000 3') read as vector of word '1000'
+    pretrained = {
+        '1000': np.array([3.0]),
+        'news': np.array([1.0, 2.0, 3.0]),
+    }
+    word_index = {'<pad>': 0, 'news': 1, '1000': 2}
+
+    matrix, stats = get_embeddings_matrix(
+        word_index, pretrained, 3, return_stats=True
+    )
+
+    np.testing.assert_array_equal(matrix[1], [1.0, 2.0, 3.0])
+    np.testing.assert_array_equal(matrix[2], [0.0, 0.0, 0.0])
+    assert stats['found'] == 1
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+from fasttext import convert_fasttext_model, get_vocab_index_paths, \
+    load_fasttext_model
+
+VEC = '''4 2
+the 0.1 0.2
+news 0.3 0.4
+zebra 0.5 0.6
+čaj 0.7 0.8
+'''
+
+
+def test_binary_store_looks_up_words(tmp_path):
+    path = str(tmp_path / 'model.vec')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(VEC)
+    _, vocab_path = convert_fasttext_model(path)
+
+    # Store converted without index builds it on load
+    for index_path in get_vocab_index_paths(vocab_path):
+        os.remove(index_path)
+
+    for _ in range(2):
+        store = load_fasttext_model(path)
+
+        assert len(store) == 4
+        np.testing.assert_array_equal(
+            store.lookup(['zebra', 'missing', 'the', 'čaj', 'zebras' * 10]),
+            [2, -1, 0, 3, -1]
+        )
+        np.testing.assert_allclose(store.get('news'), [0.3, 0.4])
+        assert store.get('missing') is None
+        assert 'the' in store and 'th' not in store
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+from tensorflow import keras
+from tensorflow.keras.preprocessing.sequence import pad_sequences
+from inference import CompiledPredictor, compile_function, \
+    get_bucket_lengths, rebuild_model
+from model import FakeNewsDetectionNet
+from sequences import SequenceWindowing
+
+
+@pytest.fixture(scope='module')
+def saved_model(tmp_path_factory):
+    generator = np.random.RandomState(0)
+    model = FakeNewsDetectionNet(
+        dim_input=50,
+        dim_embeddings=8,
+        embeddings=generator.normal(size=(50, 8)).astype('float32'),
+        lstm_units=4,
+        num_hidden_layers=1
+    )
+    model.compile(optimizer='adam', loss='binary_crossentropy')
+    x = generator.randint(1, 50, (16, 20)).astype('int32')
+    x[:8, 12:] = 0
+    model.fit(x, generator.randint(0, 2, 16), epochs=1, verbose=0)
+
+    path = str(tmp_path_factory.mktemp('model') / 'model')
+    model.save(path)
+
+    return keras.models.load_model(path), x
+
+
+def test_rebuilt_model_reproduces_saved_model(saved_model):
+    loaded, x = saved_model
+
+    rebuilt = rebuild_model(loaded)
+
+    np.testing.assert_allclose(
+        rebuilt.predict(x), loaded.predict(x), rtol=1e-5, atol=1e-6
+    )
+
+
+def test_compiled_predictor_matches_keras_up_to_training_length(saved_model):
+    loaded, x = saved_model
+    rebuilt = rebuild_model(loaded)
+    long_x = np.tile(x, (1, 9))[:, :150]
+
+    predictor = CompiledPredictor(
+        rebuilt, lengths=get_bucket_lengths(150), warmup_batch_sizes=()
+    )
+
+    np.testing.assert_allclose(
+        predictor.predict(long_x), rebuilt.predict(long_x),
+        rtol=1e-5, atol=1e-6
+    )
+
+
+def test_bucket_lengths_end_with_training_length():
+    assert get_bucket_lengths(2500) == (64, 128, 256, 512, 1024, 2048, 2500)
+    assert get_bucket_lengths(300) == (64, 128, 256, 300)
+    assert get_bucket_lengths(None)[-1] == 2048
+
+
+@pytest.mark.parametrize('strategy', ['head', 'head_tail', 'windows'])
+def test_compiled_predictor_keeps_windows_whole(saved_model, strategy):
+    loaded, x = saved_model
+    rebuilt = rebuild_model(loaded)
+    long_x = [list(sequence) * 20 for sequence in x[8:]]
+    windowing = SequenceWindowing(100, strategy, max_windows=3)
+
+    predictor = CompiledPredictor(
+        rebuilt,
+        lengths=get_bucket_lengths(windowing.max_len),
+        warmup_batch_sizes=()
+    )
+
+    def predict_fn(model):
+        return lambda windows: model.predict(
+            pad_sequences(windows, padding='post')
+        )[:, 0]
+
+    np.testing.assert_allclose(
+        windowing.predict(predict_fn(predictor), long_x),
+        windowing.predict(predict_fn(rebuilt), long_x),
+        rtol=1e-5, atol=1e-6
+    )
+
+
+def test_jit_falls_back_without_xla_support(monkeypatch):
+    tf_function = tf.function
+
+    def function(func, input_signature=None, **kwargs):
+        if kwargs:
+            raise TypeError(f'Unexpected arguments {list(kwargs)}.')
+        return tf_function(func, input_signature=input_signature)
+
+    monkeypatch.setattr(tf, 'function', function)
+    double = compile_function(
+        lambda x: x * 2, [tf.TensorSpec([None], tf.int32)], jit=True
+    )
+
+    assert double(tf.constant([1, 2])).numpy().tolist() == [2, 4]
@@ -0,0 +1,28 @@
+import requests
+from monant_data_client import CentralStorageClient
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+
+def test_timed_out_request_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(CentralStorageClient, 'token', 'token')
+    client = CentralStorageClient(
+        'user', 'password', 'http://localhost', str(tmp_path),
+        rate_limit=None, backoff=0, timeout=(1, 2)
+    )
+    timeouts = []
+
+    def request(method, url, **kwargs):
+        timeouts.append(kwargs['timeout'])
+        if len(timeouts) == 1:
+            raise requests.ReadTimeout()
+        return Response()
+
+    monkeypatch.setattr(client.session, 'request', request)
+
+    assert client.request('GET', 'http://localhost/articles').status_code \
+        == 200
+    assert timeouts == [(1, 2), (1, 2)]
@@ -0,0 +1,106 @@
+import http.client
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+from predict import predict_texts
+from server import MicroBatcher, PredictionRequestHandler, PredictionServer
+
+ARTICLE = ' '.join(
+    ['The government announced new rules for local schools and hospitals '
+     'on Monday.'] * 12
+)
+
+
+class ConstantModel:
+
+    def predict(self, x):
+        return np.full((len(x), 1), 0.5, dtype='float32')
+
+
+class EchoBatcher:
+
+    def submit(self, text):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result(0.5)
+        return future
+
+
+def test_identical_texts_are_all_predicted():
+    word_index = {word: i + 1 for i, word in enumerate(
+        set(ARTICLE.lower().replace('.', ' ').split())
+    )}
+
+    predictions = predict_texts(
+        ConstantModel(), word_index, [ARTICLE, ARTICLE]
+    )
+
+    assert predictions == [0.5, 0.5]
+
+
+@pytest.fixture
+def server():
+    PredictionRequestHandler.batcher = EchoBatcher()
+    server = PredictionServer(('127.0.0.1', 0), PredictionRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, data):
+    request = urllib.request.Request(
+        f'{url}/predict', json.dumps(data).encode('utf-8')
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_server_rejects_texts_which_are_not_list(server):
+    status, _ = post(server, {'texts': 'abc'})
+
+    assert status == 400
+
+
+def test_server_predicts_list_of_texts(server):
+    assert post(server, {'texts': ['abc', 'abc']}) == \
+        (200, {'predictions': [0.5, 0.5]})
+
+
+def test_server_rejects_too_large_body(server, monkeypatch):
+    monkeypatch.setattr(PredictionRequestHandler, 'max_body_size', 16)
+
+    status, _ = post(server, {'texts': ['abc' * 10]})
+
+    assert status == 413
+
+
+def test_server_rejects_invalid_content_length(server):
+    connection = http.client.HTTPConnection(server.split('//')[1])
+    connection.putrequest('POST', '/predict')
+    connection.putheader('Content-Length', '-1')
+    connection.endheaders()
+
+    assert connection.getresponse().status == 400
+    connection.close()
+
+
+def test_failing_text_fails_only_its_future():
+    def predict_fn(texts):
+        if 'bad' in texts:
+            raise ValueError('Invalid text.')
+        return [len(text) for text in texts]
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=2, max_wait=1)
+    good, bad = batcher.submit('good'), batcher.submit('bad')
+
+    assert good.result(timeout=5) == 4
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
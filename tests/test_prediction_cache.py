@@ -0,0 +1,63 @@
+import time
+from prediction_cache import PredictionCache, get_model_id, predict_cached
+
+
+def test_expired_entries_are_not_used_and_leave_memory():
+    cache = PredictionCache('model', ttl=0.05)
+    key = cache.get_key('text')
+    cache.set_many({key: 0.5})
+
+    time.sleep(0.1)
+
+    assert cache.get_many([key]) == {}
+    assert cache.get_stats()['memory_size'] == 0
+
+
+def test_short_ttl_does_not_delete_shared_entries(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    other = PredictionCache('other', path=path)
+    other_key = other.get_key('text')
+    other.set_many({other_key: 0.25})
+
+    short = PredictionCache('model', path=path, ttl=0.01)
+    time.sleep(0.05)
+    short.set_many({short.get_key('text'): 0.5})
+
+    reopened = PredictionCache('other', path=path)
+    assert reopened.get_many([other_key]) == {other_key: 0.25}
+
+
+def test_disk_is_evicted_to_size_limit(tmp_path):
+    cache = PredictionCache('model', path=str(tmp_path / 'predictions.db'),
+                            max_disk_size=10)
+
+    for i in range(5):
+        cache.set_many({cache.get_key(f'{i}-{j}'): 0.5 for j in range(4)})
+
+    assert cache.count_disk() <= 10
+
+
+def test_duplicate_texts_are_predicted_once():
+    cache = PredictionCache('model')
+    predicted = []
+
+    def predict_fn(sequences):
+        predicted.extend(sequences)
+        return [len(sequence) for sequence in sequences]
+
+    predictions = predict_cached(
+        cache, ['a b', 'a b', 'c'], [[1, 2], [1, 2], [3]], predict_fn
+    )
+
+    assert predictions == [2.0, 2.0, 1.0]
+    assert predicted == [[1, 2], [3]]
+
+
+def test_model_id_depends_on_mode_and_options():
+    ids = {
+        get_model_id('missing-training'),
+        get_model_id('missing-training', mode='compiled'),
+        get_model_id('missing-training', options='head:2500')
+    }
+
+    assert len(ids) == 3
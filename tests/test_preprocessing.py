@@ -0,0 +1,14 @@
+from src.data.preprocessing import get_pipeline
+
+
+def test_pipeline_configures_language_detection(tmp_path):
+    pipeline = get_pipeline(
+        drop_duplicates=False,
+        language_sample_size=1000,
+        language_cache=str(tmp_path / 'languages.db')
+    )
+    language_filter = pipeline.named_steps['articles_filter'].filters[-1]
+
+    assert 'dup_filter' not in pipeline.named_steps
+    assert language_filter.sample_size == 1000
+    assert language_filter.cache_path == str(tmp_path / 'languages.db')
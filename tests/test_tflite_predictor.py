@@ -0,0 +1,26 @@
+import numpy as np
+import tflite_predictor
+from tflite_predictor import TFLitePredictor
+
+
+class Interpreter:
+    """Interpreter of TensorFlow 2.0 (without `num_threads`)."""
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    def get_input_details(self):
+        return [{'index': 0, 'shape': np.array([1, 8])}]
+
+    def get_output_details(self):
+        return [{'index': 1}]
+
+
+def test_interpreter_without_num_threads(monkeypatch):
+    monkeypatch.setattr(tflite_predictor, 'Interpreter', Interpreter)
+
+    for num_threads in (None, 4):
+        predictor = TFLitePredictor('model.tflite', num_threads=num_threads)
+
+        assert predictor.interpreter.model_path == 'model.tflite'
+        assert predictor.fixed_batch